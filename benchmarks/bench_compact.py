@@ -0,0 +1,54 @@
+"""
+Measure how much markdown compaction shrinks the docs already collected
+in github_docs/, in characters and prompt tokens.
+
+    python -m benchmarks.bench_compact [docs_dir]
+"""
+import sys
+import time
+from pathlib import Path
+
+from compact import compact_text
+from docs import DOCS_DIR, list_repo_docs
+from extract import needs_extraction
+from packing import count_tokens
+
+MODEL = 'gpt-4o-mini'
+
+
+def main():
+    docs_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else DOCS_DIR
+    total_chars = total_compact_chars = total_tokens = total_compact_tokens = 0
+    elapsed = 0.0
+
+    print(f"{'repository':45} {'files':>6} {'chars':>10} {'after':>10} {'tokens':>9} {'after':>9} {'saved':>7}")
+    for repo_dir in sorted(p for p in docs_dir.iterdir() if p.is_dir() and not p.name.startswith('.')):
+        files = [path for path in list_repo_docs(repo_dir) if not needs_extraction(path)]
+        if not files:
+            continue
+        chars = compact_chars = tokens = compact_tokens = 0
+        for path in files:
+            text = path.read_text(encoding='utf-8', errors='ignore')
+            start = time.perf_counter()
+            compacted = compact_text(text, path.suffix)
+            elapsed += time.perf_counter() - start
+            chars += len(text)
+            compact_chars += len(compacted)
+            tokens += count_tokens(text, MODEL)
+            compact_tokens += count_tokens(compacted, MODEL)
+
+        total_chars += chars
+        total_compact_chars += compact_chars
+        total_tokens += tokens
+        total_compact_tokens += compact_tokens
+        saved = 1 - compact_tokens / tokens if tokens else 0
+        print(f"{repo_dir.name[:45]:45} {len(files):>6} {chars:>10} {compact_chars:>10} "
+              f"{tokens:>9} {compact_tokens:>9} {saved:>6.1%}")
+
+    if total_tokens:
+        print(f"\ntotal: {total_chars} -> {total_compact_chars} chars, {total_tokens} -> {total_compact_tokens} tokens "
+              f"({1 - total_compact_tokens / total_tokens:.1%} fewer), compaction took {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
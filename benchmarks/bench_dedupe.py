@@ -0,0 +1,64 @@
+"""
+Measure how many prompt tokens near-duplicate elimination saves on the
+docs already collected in github_docs/.
+
+    python -m benchmarks.bench_dedupe [docs_dir]
+"""
+import sys
+import time
+from pathlib import Path
+
+from dedupe import dedupe_docs
+from docs import DOCS_DIR, list_repo_docs
+from extract import extract_texts, needs_extraction
+from packing import count_tokens
+
+MODEL = 'gpt-4o-mini'
+
+
+def load_repo(repo_dir):
+    files = list_repo_docs(repo_dir)
+    extracted = extract_texts(files)
+    docs = []
+    for path in files:
+        if needs_extraction(path):
+            text = extracted.get(path)
+            if text is None:
+                continue
+        else:
+            text = path.read_text(encoding='utf-8', errors='ignore')
+        docs.append((path.relative_to(repo_dir).as_posix(), text))
+    return docs
+
+
+def main():
+    docs_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else DOCS_DIR
+    total_before = total_after = total_dropped = 0
+    elapsed = 0.0
+
+    print(f"{'repository':45} {'files':>6} {'dropped':>8} {'tokens':>10} {'after':>10} {'saved':>7}")
+    for repo_dir in sorted(p for p in docs_dir.iterdir() if p.is_dir() and not p.name.startswith('.')):
+        docs = load_repo(repo_dir)
+        if not docs:
+            continue
+        start = time.perf_counter()
+        kept, dropped = dedupe_docs(docs)
+        elapsed += time.perf_counter() - start
+
+        before = sum(count_tokens(text, MODEL) for _, text in docs)
+        after = sum(count_tokens(text, MODEL) for _, text in kept)
+        total_before += before
+        total_after += after
+        total_dropped += len(dropped)
+        saved = 1 - after / before if before else 0
+        print(f"{repo_dir.name[:45]:45} {len(docs):>6} {len(dropped):>8} {before:>10} {after:>10} {saved:>6.1%}")
+        for entry in dropped:
+            print(f"    - {entry['path']} ({entry['kind']} of {entry['duplicate_of']}, {entry['similarity']:.2f})")
+
+    if total_before:
+        print(f"\ntotal: {total_dropped} docs dropped, {total_before} -> {total_after} tokens "
+              f"({1 - total_after / total_before:.1%} fewer), dedupe took {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare serial and concurrent star fetching against a local fake GitHub.
+
+    python -m benchmarks.bench_fetch
+"""
+import logging
+import time
+
+import requests
+
+import fetch
+import github_client
+from benchmarks.fakes import FakeGitHub, make_stars
+
+PAGE_COUNTS = [1, 5, 10, 20, 40]
+LATENCY = 0.05
+
+
+def serial_fetch(api_url):
+    """The previous implementation: one page at a time until an empty page."""
+    page = 1
+    repo_urls = []
+    while True:
+        response = requests.get(
+            f'{api_url}/user/starred?page={page}&per_page={fetch.PER_PAGE}',
+            headers=github_client.headers
+        )
+        repos = response.json()
+        if not repos:
+            break
+        repo_urls.extend(repo['html_url'] for repo in repos)
+        page += 1
+    return repo_urls
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"{'pages':>6} {'serial s':>10} {'parallel s':>11} {'speedup':>8}")
+    for pages in PAGE_COUNTS:
+        stars = make_stars(pages * fetch.PER_PAGE)
+        with FakeGitHub(stars, latency=LATENCY) as github:
+            github_client.GITHUB_API_URL = github.url
+            serial, serial_time = timed(lambda: serial_fetch(github.url))
+            parallel, parallel_time = timed(lambda: fetch.get_starred_repo_urls(use_cache=False))
+        assert serial == parallel == [s['repo']['html_url'] for s in stars]
+        print(f"{pages:>6} {serial_time:>10.3f} {parallel_time:>11.3f} {serial_time / parallel_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare the old rglob-based find_docs with the pruning scandir walker on a
+synthetic JS-monorepo-shaped tree.
+
+    python -m benchmarks.bench_find_docs [file_count]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import docs
+
+PACKAGES = 50
+
+
+def rglob_find_docs(repo_path):
+    """The previous implementation of docs.find_docs."""
+    docs_files = []
+    repo_path = Path(repo_path)
+    for file_path in repo_path.rglob('*'):
+        if any(skip_dir in file_path.parts for skip_dir in docs.SKIP_DIRS):
+            continue
+        if file_path.is_file() and file_path.suffix.lower() in docs.DOC_EXTENSIONS:
+            docs_files.append(file_path)
+    return docs_files
+
+
+def build_tree(root, file_count):
+    """
+    Spread `file_count` files over PACKAGES packages. About 90% land in
+    node_modules, the rest is source plus a few docs per package.
+    """
+    per_package = file_count // PACKAGES
+    for p in range(PACKAGES):
+        package = root / 'packages' / f'pkg{p}'
+        (package / 'docs').mkdir(parents=True)
+        (package / 'src').mkdir()
+        (package / 'README.md').write_text(f'# pkg{p}\n')
+        (package / 'docs' / 'guide.md').write_text('guide\n')
+        created = 2
+        for i in range(per_package // 10):
+            (package / 'src' / f'mod{i}.js').write_text('')
+            created += 1
+        vendored = package / 'node_modules'
+        d = None
+        while created < per_package:
+            if created % 100 == 0 or d is None:
+                d = vendored / f'dep{created // 100}'
+                d.mkdir(parents=True)
+                (d / 'README.md').write_text('vendored\n')
+                created += 1
+            (d / f'f{created}.js').write_text('')
+            created += 1
+
+
+def timed(func, path):
+    start = time.perf_counter()
+    result = func(path)
+    return result, time.perf_counter() - start
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    root = Path(tempfile.mkdtemp(prefix='bench_find_docs_'))
+    try:
+        print(f"Building a {file_count}-file tree in {root}...")
+        build_tree(root, file_count)
+        os.sync()
+
+        old, old_time = timed(rglob_find_docs, root)
+        new, new_time = timed(docs.find_docs, root)
+        assert sorted(map(str, old)) == sorted(map(str, new))
+
+        print(f"docs found:        {len(new)}")
+        print(f"rglob find_docs:   {old_time:.2f}s")
+        print(f"scandir walk_docs: {new_time:.2f}s ({old_time / new_time:.1f}x faster)")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
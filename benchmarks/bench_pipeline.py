@@ -0,0 +1,170 @@
+"""
+Run the whole pipeline (fetch_all_starred_docs_with_summary) offline and
+report throughput, per-stage latency and peak memory.
+
+Synthetic repositories are served as local git remotes, the starred list
+and GraphQL metadata by FakeGitHub, and summaries by FakeOpenAI with
+configurable latency and 429 injection. Each size runs in a fresh process
+so peak RSS is measured per run.
+
+    python -m benchmarks.bench_pipeline [--repos 10 100 1000] [--mode async|batch]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fakes import FakeGitHub, FakeOpenAI, make_stars
+
+REPO_SIZES = [10, 100, 1000]
+STAGES = ['github /user/starred', 'github /graphql', 'stage fetch docs', 'stage summarize', 'stage save']
+WORDS = ('install configure server client request cache token model query index plugin config '
+         'option deploy build release worker queue schema table stream event handler').split()
+
+
+def paragraph(rng, sentences=4):
+    return ' '.join(
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + '.'
+        for _ in range(sentences)
+    )
+
+
+def repo_files(i):
+    """Docs plus a little code for one synthetic repository, different per repo."""
+    rng = random.Random(i)
+    name = f'repo{i}'
+    readme = [f'# {name}', '', f'[![CI](https://img.shields.io/badge/ci-passing-green)](https://ci.example.com/{name})', '']
+    for section in ('Overview', 'Installation', 'Usage', 'Configuration'):
+        readme += [f'## {section}', '', paragraph(rng), '', '```bash', f'pip install {name}', '```', '']
+    files = {
+        'README.md': '\n'.join(readme),
+        'docs/guide.md': '\n\n'.join(['# Guide'] + [paragraph(rng, 6) for _ in range(rng.randint(3, 8))]),
+        'docs/api.md': '\n\n'.join(['# API'] + [f'## `{w}()`\n\n{paragraph(rng)}' for w in rng.sample(WORDS, 5)]),
+        'CHANGELOG.md': '\n'.join(f'- {paragraph(rng, 1)}' for _ in range(10)),
+        f'src/{name}/__init__.py': '\n'.join(f'def {w}():\n    return {j}\n' for j, w in enumerate(WORDS)),
+    }
+    return {path: text.encode() for path, text in files.items()}
+
+
+def make_remote(path, files):
+    """Create a bare repository with one commit on main, via a single git fast-import."""
+    subprocess.run(['git', 'init', '--bare', '-q', '-b', 'main', str(path)], check=True)
+    stream = [b'commit refs/heads/main\n', b'committer Bench <bench@example.com> 1700000000 +0000\n',
+              b'data 7\ninitial\n']
+    for file_path, data in files.items():
+        stream.append(f'M 100644 inline {file_path}\ndata {len(data)}\n'.encode() + data + b'\n')
+    subprocess.run(['git', '-C', str(path), 'fast-import', '--quiet'], input=b''.join(stream), check=True)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_child(args):
+    """Build `args.child` remotes, run the pipeline against the fakes and print one JSON line."""
+    count = args.child
+    work_dir = Path(tempfile.mkdtemp(prefix='bench_pipeline_'))
+    remotes = work_dir / 'remotes'
+    for i in range(count):
+        make_remote(remotes / f'owner{i}' / f'repo{i}', repo_files(i))
+
+    stars = make_stars(count)
+    for star in stars:
+        star['repo']['html_url'] = (remotes / star['repo']['full_name']).as_uri()
+        star['repo']['head_oid'] = f'{len(star["repo"]["full_name"]):040x}'
+
+    run_dir = work_dir / 'run'
+    run_dir.mkdir()
+    os.chdir(run_dir)
+    try:
+        run_pipeline(args, count, stars, run_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_pipeline(args, count, stars, run_dir):
+    with FakeGitHub(stars, latency=args.github_latency) as github, \
+            FakeOpenAI(latency=args.openai_latency, per_token_latency=args.per_token_latency,
+                       rate_limit_every=args.rate_limit_every, batch_delay=1.0) as openai_server:
+        os.environ.update({
+            'GITHUB_API_URL': github.url,
+            'OPENAI_BASE_URL': openai_server.url,
+            'OPENAI_API_KEY': 'bench',
+            'SUMMARY_MODE': args.mode,
+            'SUMMARY_CONCURRENCY': str(args.concurrency),
+            'CLONE_WORKERS': str(args.workers),
+            'OPENAI_RPM': '100000',
+            'OPENAI_TPM': '100000000',
+            'BATCH_POLL_INTERVAL': '1',
+        })
+        import logging
+        import client
+        import metrics
+        logging.getLogger().setLevel(logging.WARNING)
+
+        start = time.perf_counter()
+        client.fetch_all_starred_docs_with_summary()
+        elapsed = time.perf_counter() - start
+        summaries = sum(1 for _ in (run_dir / 'github_docs').glob('*/SUMMARY.md'))
+        print(json.dumps({
+            'repos': count,
+            'summaries': summaries,
+            'seconds': elapsed,
+            'openai_requests': openai_server.server.request_count,
+            'peak_rss_mb': peak_rss_mb(),
+            'timings': metrics.snapshot()['timings'],
+        }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repos', type=int, nargs='+', default=REPO_SIZES)
+    parser.add_argument('--mode', choices=['async', 'batch'], default='async')
+    parser.add_argument('--workers', type=int, default=4, help='clone workers')
+    parser.add_argument('--concurrency', type=int, default=16, help='summary requests in flight (async mode)')
+    parser.add_argument('--github-latency', type=float, default=0.02)
+    parser.add_argument('--openai-latency', type=float, default=0.2)
+    parser.add_argument('--per-token-latency', type=float, default=0.001)
+    parser.add_argument('--rate-limit-every', type=int, default=25, help='answer every n-th OpenAI POST with a 429')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    child_args = [f'--{name.replace("_", "-")}={getattr(args, name)}' for name in
+                  ('mode', 'workers', 'concurrency', 'github_latency', 'openai_latency',
+                   'per_token_latency', 'rate_limit_every')]
+    print(f"{'repos':>6} {'summaries':>10} {'seconds':>9} {'repos/min':>10} {'peak RSS MB':>12}")
+    results = []
+    for count in args.repos:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_pipeline', f'--child={count}', *child_args],
+            check=True, capture_output=True, text=True, cwd=Path(__file__).resolve().parent.parent
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{count:>6} {result['summaries']:>10} {result['seconds']:>9.1f} "
+              f"{count / result['seconds'] * 60:>10.1f} {result['peak_rss_mb']:>12.1f}")
+
+    print(f"\n{'stage (p50 / p95 ms)':28}" + ''.join(f"{r['repos']:>18}" for r in results))
+    for stage in STAGES:
+        cells = []
+        for result in results:
+            t = result['timings'].get(stage)
+            cells.append(f"{t['p50'] * 1000:.0f} / {t['p95'] * 1000:.0f}" if t else '-')
+        print(f"{stage:28}" + ''.join(f"{cell:>18}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
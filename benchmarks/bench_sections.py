@@ -0,0 +1,74 @@
+"""
+Compare single-call summaries with section-parallel ones against
+FakeOpenAI, whose latency grows with the number of tokens generated.
+
+    python -m benchmarks.bench_sections [repos]
+"""
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+
+from benchmarks.fakes import FakeOpenAI
+from metrics import percentile
+
+BATCH_COUNTS = [2, 3, 4, 6]
+SECTION_TOKENS = 300
+LATENCY = 0.3
+PER_TOKEN_LATENCY = 0.004
+SECTION_RE = re.compile(r'^### (\d+\. .+)$', re.M)
+
+
+def responder(request):
+    """Write SECTION_TOKENS tokens for every section heading the prompt asks for, within max_tokens."""
+    prompt = request['messages'][-1]['content']
+    reply = ''.join(f"### {heading}\n\n" + "detail " * (SECTION_TOKENS * 4 // 7) + "\n\n"
+                    for heading in SECTION_RE.findall(prompt))
+    return reply[:request['max_tokens'] * 4]
+
+
+def run(client, fake, repos, docs_content, policy):
+    times = []
+    fake.server.requests.clear()
+    for i in range(repos):
+        start = time.perf_counter()
+        summary = client.summarize_docs(docs_content, f"bench_repo{i}", policy=policy)
+        times.append(time.perf_counter() - start)
+        assert summary and summary.index('### 1.') < summary.index('### 13.')
+    prompt_chars = sum(len(m['content']) for r in fake.server.requests for m in r['messages'])
+    return times, len(fake.server.requests), prompt_chars // 4
+
+
+def main():
+    repos = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    os.chdir(tempfile.mkdtemp(prefix='bench_sections_'))
+
+    with FakeOpenAI(latency=LATENCY, per_token_latency=PER_TOKEN_LATENCY, responder=responder) as fake:
+        os.environ.setdefault('OPENAI_API_KEY', 'bench')
+        os.environ['OPENAI_BASE_URL'] = fake.url
+        import client
+        logging.getLogger().setLevel(logging.WARNING)
+        client.SUMMARY_STREAM = False
+        client.summary_cache = None
+        docs_content = "\n\n".join(f"## Topic {i}\n\n" + "Some documentation text. " * 200 for i in range(20))
+        policy = client.default_policy()
+
+        print(f"{'mode':>10} {'batches':>8} {'p50 s':>7} {'max s':>7} {'requests':>9} {'prompt tokens':>14}")
+        client.SECTION_PARALLEL = False
+        times, requests, prompt_tokens = run(client, fake, repos, docs_content, policy)
+        single = percentile(times, 50)
+        print(f"{'single':>10} {1:>8} {single:>7.2f} {max(times):>7.2f} {requests:>9} {prompt_tokens:>14}")
+
+        client.SECTION_PARALLEL = True
+        for batches in BATCH_COUNTS:
+            client.SECTION_BATCHES = batches
+            times, requests, prompt_tokens = run(client, fake, repos, docs_content, policy)
+            p50 = percentile(times, 50)
+            print(f"{'sections':>10} {batches:>8} {p50:>7.2f} {max(times):>7.2f} {requests:>9} {prompt_tokens:>14}"
+                  f"  ({single / p50:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
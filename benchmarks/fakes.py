@@ -0,0 +1,453 @@
+"""Local stand-ins for the remote services the pipeline talks to."""
+import hashlib
+import io
+import json
+import re
+import tarfile
+import threading
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+STAR_EPOCH = datetime(2024, 1, 1)
+TARBALL_RE = re.compile(r'^/repos/([^/]+/[^/]+)/tarball')
+GRAPHQL_REPO_RE = re.compile(r'(\w+): repository\(owner: "([^"]+)", name: "([^"]+)"\)')
+# Prompt caching works on prefixes of at least ~1024 tokens, in ~128-token steps
+CACHE_BLOCK_CHARS = 512
+CACHE_MIN_CHARS = 4096
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, extra_headers=None):
+        body = json.dumps(payload).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.server.not_modified_count += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_injected_error(self):
+        """Answer with the next queued (status, headers) error, if any."""
+        if not self.server.inject:
+            return False
+        status, extra_headers = self.server.inject.pop(0)
+        self.send_json(status, {'message': 'You have exceeded a secondary rate limit'}, extra_headers)
+        return True
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        time.sleep(server.latency)
+        server.request_count += 1
+        if self.send_injected_error():
+            return
+
+        if url.path == '/user/starred':
+            page = int(query.get('page', ['1'])[0])
+            per_page = int(query.get('per_page', ['30'])[0])
+            stars = server.stars[(page - 1) * per_page:page * per_page]
+            if 'star+json' not in self.headers.get('Accept', ''):
+                stars = [star['repo'] for star in stars]
+            last_page = max(1, -(-len(server.stars) // per_page))
+            base = f'http://{self.headers["Host"]}/user/starred?per_page={per_page}'
+            links = []
+            if page < last_page:
+                links.append(f'<{base}&page={page + 1}>; rel="next"')
+                links.append(f'<{base}&page={last_page}>; rel="last"')
+            self.send_json(200, stars, {'Link': ', '.join(links)} if links else None)
+            return
+
+        match = TARBALL_RE.match(url.path)
+        if match and match.group(1) in server.tarballs:
+            body = server.tarballs[match.group(1)]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_json(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(server.latency)
+        server.request_count += 1
+        if self.send_injected_error():
+            return
+
+        if urlparse(self.path).path == '/graphql':
+            repos = {star['repo']['full_name']: star['repo'] for star in server.stars}
+            data = {}
+            query = json.loads(body)['query']
+            for alias, owner, name in GRAPHQL_REPO_RE.findall(query):
+                repo = repos.get(f'{owner}/{name}')
+                data[alias] = repo and {
+                    'defaultBranchRef': {'target': {'oid': repo.get('head_oid', '0' * 40)}},
+                    'pushedAt': repo['pushed_at'],
+                    'diskUsage': repo.get('disk_usage', 1),
+                    'isArchived': repo.get('is_archived', False),
+                }
+            self.send_json(200, {'data': data})
+            return
+
+        self.send_json(404, {'message': 'Not Found'})
+
+
+class FakeGitHub:
+    """Serve a synthetic /user/starred listing on a background thread."""
+
+    def __init__(self, stars, latency=0.0, tarballs=None):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGitHubHandler)
+        self.server.daemon_threads = True
+        self.server.stars = stars
+        self.server.latency = latency
+        self.server.request_count = 0
+        self.server.not_modified_count = 0
+        self.server.inject = []
+        self.server.tarballs = tarballs or {}
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_stars(count, start=0):
+    """
+    Generate `count` starred items in the star+json shape of the GitHub API,
+    newest first. Plain listings serve only the nested `repo` objects.
+    """
+    stars = []
+    for i in range(start + count - 1, start - 1, -1):
+        stars.append({
+            'starred_at': (STAR_EPOCH + timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'repo': {
+                'full_name': f'owner{i}/repo{i}',
+                'html_url': f'https://github.com/owner{i}/repo{i}',
+                'pushed_at': '2024-01-01T00:00:00Z',
+                'default_branch': 'main',
+            },
+        })
+    return stars
+
+
+def make_tarball(full_name, files):
+    """Build a gzipped GitHub-style archive of {path: bytes}, rooted at <owner>-<repo>-<sha>/."""
+    prefix = full_name.replace('/', '-') + '-0123abc'
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for path, data in files.items():
+            info = tarfile.TarInfo(f'{prefix}/{path}')
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, extra_headers=None):
+        self.send_body(status, json.dumps(payload).encode(), 'application/json', extra_headers)
+
+    def send_body(self, status, body, content_type, extra_headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, completion, cut):
+        """Send a completion as server-sent chunk events; a `cut` stream stops halfway without finishing."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        content = completion['choices'][0]['message']['content']
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        if cut:
+            pieces = pieces[:len(pieces) // 2]
+        base = {'id': completion['id'], 'object': 'chat.completion.chunk', 'created': completion['created'],
+                'model': completion['model']}
+        events = [dict(base, choices=[{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}])
+                  for piece in pieces]
+        if not cut:
+            finish_reason = completion['choices'][0]['finish_reason']
+            events.append(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': finish_reason}]))
+            events.append(dict(base, choices=[], usage=completion['usage']))
+        for event in events:
+            self.write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+        if cut:
+            # Drop the connection without the terminating chunk, like a reset mid-response
+            self.close_connection = True
+            return
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b'')
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def read_upload(self, body):
+        """Return (fields, file_bytes, filename) from a multipart/form-data body."""
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+        message = BytesParser(policy=HTTP).parsebytes(header + body)
+        fields, content, filename = {}, b'', None
+        for part in message.iter_parts():
+            if part.get_filename():
+                filename = part.get_filename()
+                content = part.get_payload(decode=True)
+            else:
+                fields[part.get_param('name', header='content-disposition')] = part.get_content().strip()
+        return fields, content, filename
+
+    def do_GET(self):
+        server = self.server
+        path = urlparse(self.path).path
+        with server.lock:
+            server.request_count += 1
+
+        match = re.match(r'.*/batches/([^/]+)$', path)
+        if match and match.group(1) in server.batches:
+            self.send_json(200, server.poll_batch(match.group(1)))
+            return
+
+        match = re.match(r'.*/files/([^/]+)/content$', path)
+        if match and match.group(1) in server.files:
+            self.send_body(200, server.files[match.group(1)]['content'], 'application/octet-stream')
+            return
+
+        self.send_json(404, {'error': {'message': f'Unknown path {path}'}})
+
+    def do_POST(self):
+        server = self.server
+        path = urlparse(self.path).path
+        body = self.read_body()
+        with server.lock:
+            server.request_count += 1
+            inject_429 = server.rate_limit_every and server.request_count % server.rate_limit_every == 0
+        if inject_429:
+            self.send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                           {'Retry-After': '0'})
+            return
+
+        if path.endswith('/chat/completions'):
+            request = json.loads(body)
+            if request.get('stream'):
+                self.send_stream(server.complete(request), server.stream_cut())
+            else:
+                self.send_json(200, server.complete(request))
+            return
+
+        if path.endswith('/files'):
+            fields, content, filename = self.read_upload(body)
+            self.send_json(200, server.add_file(content, filename, fields.get('purpose', 'batch')))
+            return
+
+        if path.endswith('/batches'):
+            request = json.loads(body)
+            if request.get('input_file_id') not in server.files:
+                self.send_json(400, {'error': {'message': 'Unknown input_file_id'}})
+                return
+            self.send_json(200, server.create_batch(request))
+            return
+
+        self.send_json(404, {'error': {'message': f'Unknown path {path}'}})
+
+
+class FakeOpenAI:
+    """
+    OpenAI-compatible server for chat completions and the files/batches
+    endpoints. Each completion sleeps `latency` seconds plus
+    `per_token_latency` per completion token, and every `rate_limit_every`-th
+    POST is answered with a 429. Streamed completions are sent as chunk
+    events; every `cut_stream_every`-th stream is dropped halfway through.
+    A batch reports in_progress until
+    `batch_delay` seconds after it was created, then completes with one
+    result line per request line. `responder(request)` may supply the
+    completion text; by default it is filler of `completion_tokens` words.
+    Usage reports cached prompt tokens the way automatic prefix caching
+    would: the longest prefix of the messages already seen in a request.
+    """
+
+    def __init__(self, latency=0.0, per_token_latency=0.0, completion_tokens=200, rate_limit_every=0,
+                 batch_delay=0.0, responder=None, cut_stream_every=0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenAIHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.request_count = 0
+        self.server.rate_limit_every = rate_limit_every
+        self.server.requests = []
+        self.server.files = {}
+        self.server.batches = {}
+        self.server.complete = self.complete
+        self.server.add_file = self.add_file
+        self.server.create_batch = self.create_batch
+        self.server.poll_batch = self.poll_batch
+        self.server.stream_cut = self.stream_cut
+        self.seen_prefixes = set()
+        self.stream_count = 0
+        self.cut_stream_every = cut_stream_every
+        self.latency = latency
+        self.per_token_latency = per_token_latency
+        self.completion_tokens = completion_tokens
+        self.batch_delay = batch_delay
+        self.responder = responder
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/v1'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def complete(self, request):
+        """Build a chat.completion response for a request body."""
+        with self.server.lock:
+            self.server.requests.append(request)
+        prompt_chars = sum(len(m.get('content') or '') for m in request.get('messages', []))
+        cached_tokens = self.cached_tokens(request)
+        completion_tokens = min(self.completion_tokens, request.get('max_tokens') or self.completion_tokens)
+        if self.responder:
+            content = self.responder(request)
+            completion_tokens = len(content) // 4
+        else:
+            content = f"Summary of {prompt_chars} prompt characters.\n" + "word " * completion_tokens
+        time.sleep(self.latency + self.per_token_latency * completion_tokens)
+        max_tokens = request.get('max_tokens')
+        finish_reason = 'length' if max_tokens and completion_tokens >= max_tokens else 'stop'
+        return {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': finish_reason,
+            }],
+            'usage': {
+                'prompt_tokens': prompt_chars // 4,
+                'prompt_tokens_details': {'cached_tokens': min(cached_tokens, prompt_chars // 4)},
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_chars // 4 + completion_tokens,
+            },
+        }
+
+    def cached_tokens(self, request):
+        """Tokens of the longest block-aligned prompt prefix an earlier request already sent."""
+        prompt = json.dumps(request.get('messages', []))
+        digest = hashlib.sha1()
+        keys = []
+        for start in range(0, len(prompt) - CACHE_BLOCK_CHARS + 1, CACHE_BLOCK_CHARS):
+            digest.update(prompt[start:start + CACHE_BLOCK_CHARS].encode())
+            keys.append(digest.hexdigest())
+        with self.server.lock:
+            cached = next((i for i, key in enumerate(keys) if key not in self.seen_prefixes), len(keys))
+            self.seen_prefixes.update(keys)
+        cached_chars = cached * CACHE_BLOCK_CHARS
+        return cached_chars // 4 if cached_chars >= CACHE_MIN_CHARS else 0
+
+    def stream_cut(self):
+        with self.server.lock:
+            self.stream_count += 1
+            return bool(self.cut_stream_every) and self.stream_count % self.cut_stream_every == 0
+
+    def add_file(self, content, filename, purpose):
+        file_id = f'file-{uuid.uuid4().hex[:12]}'
+        entry = {
+            'id': file_id,
+            'object': 'file',
+            'bytes': len(content),
+            'created_at': int(time.time()),
+            'filename': filename or 'upload.jsonl',
+            'purpose': purpose,
+            'status': 'processed',
+        }
+        self.server.files[file_id] = dict(entry, content=content)
+        return entry
+
+    def create_batch(self, request):
+        batch_id = f'batch_{uuid.uuid4().hex[:12]}'
+        lines = self.server.files[request['input_file_id']]['content'].decode().splitlines()
+        batch = {
+            'id': batch_id,
+            'object': 'batch',
+            'endpoint': request['endpoint'],
+            'input_file_id': request['input_file_id'],
+            'completion_window': request['completion_window'],
+            'status': 'in_progress',
+            'created_at': int(time.time()),
+            'output_file_id': None,
+            'error_file_id': None,
+            'request_counts': {'total': len([line for line in lines if line.strip()]), 'completed': 0, 'failed': 0},
+        }
+        self.server.batches[batch_id] = batch
+        return batch
+
+    def poll_batch(self, batch_id):
+        """Return the batch, running it to completion once batch_delay has passed."""
+        batch = self.server.batches[batch_id]
+        if batch['status'] == 'in_progress' and time.time() - batch['created_at'] >= self.batch_delay:
+            output = []
+            for line in self.server.files[batch['input_file_id']]['content'].decode().splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                output.append(json.dumps({
+                    'id': f'batch_req_{uuid.uuid4().hex[:12]}',
+                    'custom_id': item['custom_id'],
+                    'response': {'status_code': 200, 'request_id': 'req_fake', 'body': self.complete(item['body'])},
+                    'error': None,
+                }))
+            output_file = self.add_file(('\n'.join(output) + '\n').encode(), f'{batch_id}_output.jsonl', 'batch_output')
+            batch.update(status='completed', output_file_id=output_file['id'], completed_at=int(time.time()))
+            batch['request_counts']['completed'] = len(output)
+        return batch
@@ -1,61 +1,145 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import os
+import io
+import json
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import logging
-from docs import DOCS_DIR, CLONE_DIR, clone_repo, find_docs, copy_docs, handle_remove_readonly
+from docs import DOCS_DIR, CLONE_DIR, handle_remove_readonly, prune_unstarred, list_repo_docs, run_pool, fetch_repo_docs
 from pathlib import Path
 import shutil
 import time
-from fetch import get_starred_repo_urls
+from fetch import sync_starred_repos
+from extract import extract_texts, needs_extraction
+from metadata import fetch_repo_metadata, load_repo_metadata, save_repo_metadata, needs_refresh
+from ratelimit import RateLimiter
+from packing import DOCS_TOKEN_BUDGET, pack_docs, chunk_docs, count_tokens, save_packing_manifest
+from summary_cache import SummaryCache, content_digest
+from dedupe import DEDUPE_DOCS, dedupe_docs
+from compact import COMPACT_DOCS, compact_text
+from refresh import render_snapshot, load_snapshot, save_snapshot, docs_diff, apply_section_patch, NO_CHANGES
+from streaming import PartialSummary
+from usage import UsageLedger
+from policy import SummaryPolicy, PolicyStats, choose_policy, TIERS, PROMPT_CONDENSED, PROMPT_STANDARD, PROMPT_EXHAUSTIVE
+from sections import SECTION_PARALLEL, SECTION_BATCHES, parse_sections, group_sections, section_budget, stitch_sections
+import metrics
 
 logging.basicConfig(level=logging.INFO)
 load_dotenv()
 
+MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+MAX_TOKENS = 4096
+# Bump when build_messages changes so cached summaries are regenerated
+PROMPT_VERSION = '2'
+SUMMARY_CACHE = os.getenv('SUMMARY_CACHE', '1') != '0'
+# Summarize every repo again even if its summary is up to date; unchanged docs are served from the cache
+FORCE_SUMMARY = os.getenv('FORCE_SUMMARY', '0') == '1'
+# Update an existing summary from a diff of its docs instead of rewriting it
+SUMMARY_PATCH = os.getenv('SUMMARY_PATCH', '1') != '0'
+# Larger docs diffs get a full re-summarization
+PATCH_MAX_DIFF_TOKENS = int(os.getenv('PATCH_MAX_DIFF_TOKENS', '4000'))
+# Stream summaries into SUMMARY.md.partial so an interrupted run can continue where it stopped
+SUMMARY_STREAM = os.getenv('SUMMARY_STREAM', '1') != '0'
+# "sync" summarizes one repo at a time, "async" runs SUMMARY_CONCURRENCY calls at once,
+# "batch" submits every request through the Batch API and collects the results later
+SUMMARY_MODE = os.getenv('SUMMARY_MODE', 'sync')
+SUMMARY_CONCURRENCY = int(os.getenv('SUMMARY_CONCURRENCY', '4'))
+OPENAI_RPM = int(os.getenv('OPENAI_RPM', '500'))
+OPENAI_TPM = int(os.getenv('OPENAI_TPM', '200000'))
+BATCH_STATE_FILE = Path(os.getenv('BATCH_STATE_FILE', './summary_batch.json'))
+BATCH_POLL_INTERVAL = int(os.getenv('BATCH_POLL_INTERVAL', '60'))
+# How long one run waits for a batch; an unfinished batch is picked up by the next run
+BATCH_MAX_WAIT = int(os.getenv('BATCH_MAX_WAIT', '3600'))
+BATCH_DONE_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+# "auto" uses map-reduce only when a repo's docs don't fit DOCS_TOKEN_BUDGET
+MAP_REDUCE = os.getenv('MAP_REDUCE', 'auto')
+MAP_CHUNK_TOKENS = int(os.getenv('MAP_CHUNK_TOKENS', '12000'))
+MAP_WORKERS = int(os.getenv('MAP_WORKERS', '4'))
+NOTE_MAX_TOKENS = 1024
+NOTES_CACHE_DIR = Path(os.getenv('NOTES_CACHE_DIR', './.cache/notes'))
+# Bump when the note prompt changes so cached notes are regenerated
+NOTES_VERSION = '2'
+MAX_REDUCE_LEVELS = 3
+
 # Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+_client = None
+_client_lock = threading.Lock()
+summary_cache = SummaryCache() if SUMMARY_CACHE else None
+usage_ledger = UsageLedger()
+policy_stats = PolicyStats()
+
+def openai_client():
+    """Return the shared OpenAI client, creating it on first use so importing this module needs no API key."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        return _client
 
-def read_docs_content(docs_files, max_chars=200000):  # Increased further
+def load_docs(docs_files, repo_dir):
     """
-    Read documentation files and combine their content.
-    Limits total content to avoid token limits.
+    Read documentation files into (repo-relative path, text) pairs.
+    PDF/DOCX files are replaced by their extracted text, or left out if
+    extraction fails. Near-duplicates and translations of other docs are
+    dropped (see dedupe.dedupe_docs) before the rest are compacted with
+    COMPACT_DOCS set, since dedupe compares the link and image targets
+    compaction strips (see compact.compact_text).
     """
-    combined_content = ""
+    repo_dir = Path(repo_dir)
+    extracted = extract_texts(docs_files)
+    docs = []
     for file_path in docs_files:
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                combined_content += f"\n\n{'='*80}\n FILE: {file_path.name}\n{'='*80}\n\n{content}"
-                
-                if len(combined_content) > max_chars:
-                    logging.warning(f"Content limit reached, stopping at {len(combined_content)} chars")
-                    break
+            if needs_extraction(file_path):
+                content = extracted.get(file_path)
+                if content is None:
+                    logging.warning(f"Skipping {file_path.name}: no text could be extracted")
+                    continue
+            else:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    content = f.read()
+            docs.append((file_path.relative_to(repo_dir).as_posix(), content))
         except Exception as e:
             logging.error(f"Failed to read {file_path.name}: {e}")
-    
+
+    if DEDUPE_DOCS:
+        docs, dropped = dedupe_docs(docs)
+        for entry in dropped:
+            logging.info(f"Dropped {entry['path']} from {repo_dir.name}: {entry['kind']} of "
+                         f"{entry['duplicate_of']} (similarity {entry['similarity']:.2f})")
+
+    if COMPACT_DOCS and docs:
+        raw_chars = sum(len(text) for _, text in docs)
+        # Extracted PDF/DOCX text isn't markdown, so its suffix gets the plain cleanup
+        docs = [(rel_path, compact_text(text, Path(rel_path).suffix)) for rel_path, text in docs]
+        compacted = sum(len(text) for _, text in docs)
+        if raw_chars:
+            logging.info(f"Compacted docs for {repo_dir.name}: {raw_chars} -> {compacted} chars "
+                         f"({1 - compacted / raw_chars:.1%} smaller)")
+    return docs
+
+def write_packing_manifest(repo_dir, manifest):
+    try:
+        save_packing_manifest(repo_dir, manifest)
+    except OSError as e:
+        logging.error(f"Failed to save packing manifest for {Path(repo_dir).name}: {e}")
+
+def pack_repo_docs(docs, repo_dir, budget=DOCS_TOKEN_BUDGET):
+    """Pack loaded docs into one prompt body of at most `budget` tokens and record PACKING.json."""
+    repo_dir = Path(repo_dir)
+    combined_content, manifest = pack_docs(docs, MODEL, budget)
+    if manifest['skipped'] or any(entry['truncated'] for entry in manifest['included']):
+        logging.warning(f"Token budget reached for {repo_dir.name}: packed {len(manifest['included'])}/{len(docs)} "
+                        f"files into {manifest['used_tokens']}/{budget} tokens")
+    write_packing_manifest(repo_dir, manifest)
     return combined_content
 
-def summarize_docs(docs_content, repo_name, max_retries=5):
-    """
-    Use OpenAI to summarize documentation content with retry logic.
-    """
-    if not docs_content.strip():
-        logging.warning(f"No content to summarize for {repo_name}")
-        return None
-    
-    for attempt in range(max_retries):
-        try:
-            message = client.chat.completions.create(
-                model="gpt-4o-mini",
-                max_tokens=4096,  # Increased from 2048 to 4096
-                temperature=0.3,  # Lower temperature for more focused, detailed output
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a technical documentation expert who creates comprehensive, detailed summaries. Your summaries should be thorough, well-structured, and include all important technical details, code examples, and specific implementation guidance."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""Create an exhaustive and highly detailed summary of the documentation for the repository '{repo_name}'.
+SUMMARY_SYSTEM_PROMPT = "You are a technical documentation expert who creates comprehensive, detailed summaries. Your summaries should be thorough, well-structured, and include all important technical details, code examples, and specific implementation guidance."
+
+SUMMARY_INSTRUCTIONS = """Create an exhaustive and highly detailed summary of the repository documentation given at the end of this message.
 
 **Instructions:**
 - Be extremely thorough and comprehensive
@@ -165,53 +249,822 @@ def summarize_docs(docs_content, repo_name, max_retries=5):
 - Community resources
 - Related projects and integrations
 - Changelog highlights
+"""
+
+REQUIRED_SECTIONS_LINE = "**Required Sections (provide extensive detail for each):**"
+SUMMARY_PREAMBLE, SUMMARY_SECTIONS = parse_sections(SUMMARY_INSTRUCTIONS)
+# Section-parallel requests share this prefix; which sections to write comes after the docs
+SECTION_INSTRUCTIONS = SUMMARY_PREAMBLE.replace(REQUIRED_SECTIONS_LINE, "").rstrip() + """
+- This request covers only some sections of the summary, the rest are written separately: do not add an introduction, a conclusion or any section not listed after the documentation
+"""
+
+# For small docs (see policy.py): same headings as the full prompt, only the sections a short README can fill
+SUMMARY_INSTRUCTIONS_CONDENSED = """Create a concise but complete summary of the repository documentation given at the end of this message.
+
+**Instructions:**
+- Cover everything the documentation says; do not pad or speculate beyond it
+- Quote important commands, configuration values and code snippets
+- Use markdown formatting with headers, lists and code blocks
+- Leave out any section the documentation has nothing for
+
+**Sections:**
+
+### 1. Project Overview & Purpose
+### 2. Key Features & Capabilities
+### 4. Installation & Setup
+### 6. Usage Guide & Examples
+### 8. Configuration & Customization
+### 12. Troubleshooting & Common Issues
+"""
+
+# For medium docs: every section of the full prompt, written briefly enough to fit the tier's smaller output budget
+SUMMARY_INSTRUCTIONS_STANDARD = f"""Create a complete but compact summary of the repository documentation given at the end of this message.
+
+**Instructions:**
+- Cover every section below, in this order, each in a short paragraph or a few bullets
+- Keep the whole summary under about {round(TIERS['medium'][1] * 0.6, -2):.0f} words so no section is cut off
+- Prefer specific technical details, commands and configuration values over general descriptions
+- Use markdown formatting with headers, lists and code blocks
+- If the documentation has nothing for a section, say so in one line
+
+**Sections:**
+
+""" + "\n".join(f"### {number}. {title}" for number, title, _ in SUMMARY_SECTIONS) + "\n"
+
+INSTRUCTIONS = {
+    PROMPT_CONDENSED: SUMMARY_INSTRUCTIONS_CONDENSED,
+    PROMPT_STANDARD: SUMMARY_INSTRUCTIONS_STANDARD,
+    PROMPT_EXHAUSTIVE: SUMMARY_INSTRUCTIONS,
+}
+CLOSING_EXHAUSTIVE = "**Remember:** Be as detailed and comprehensive as possible. Include concrete examples, specific values, and actionable information throughout."
+CLOSING_STANDARD = "**Remember:** Cover every section; concrete commands and values matter more than long explanations."
+
+def build_messages(docs_content, repo_name, prompt=PROMPT_EXHAUSTIVE):
+    """
+    Build the chat messages asking for a summary of one repository, with
+    the exhaustive, standard or condensed instructions. The system prompt
+    and instructions come first and never vary, so the API's prompt cache
+    can reuse them across repos; only the tail is per-repo.
+    """
+    instructions = INSTRUCTIONS.get(prompt, SUMMARY_INSTRUCTIONS)
+    closing = CLOSING_STANDARD if prompt == PROMPT_STANDARD else CLOSING_EXHAUSTIVE
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"""{instructions}
+**Repository:** {repo_name}
 
 **Documentation Content:**
 {docs_content}
 
+{closing}"""
+        }
+    ]
+
+def build_section_messages(docs_content, repo_name, group):
+    """Build the messages asking for one group of the summary's sections; everything before the section list is shared."""
+    blocks = "\n\n".join(block for _, _, block in group)
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"""{SECTION_INSTRUCTIONS}
+**Repository:** {repo_name}
+
+**Documentation Content:**
+{docs_content}
+
+{REQUIRED_SECTIONS_LINE}
+
+{blocks}
+
+Write only the sections above, in this order, each starting with its heading exactly as given.
+
 **Remember:** Be as detailed and comprehensive as possible. Include concrete examples, specific values, and actionable information throughout."""
-                    }
-                ]
+        }
+    ]
+
+def create_completion(messages, label, max_tokens=MAX_TOKENS, max_retries=5, kind='summary', repo=None, model=None,
+                      retry_max_tokens=None):
+    """
+    Run one chat completion with retry logic and return its text, or None.
+    `label` names the request in log messages. The call's usage goes into
+    the usage ledger under `repo` (default: the label) and `kind`. A reply
+    cut off at a max_tokens below `retry_max_tokens` is requested again
+    with that budget.
+    """
+    model = model or MODEL
+    for attempt in range(max_retries):
+        try:
+            start = time.perf_counter()
+            message = openai_client().chat.completions.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=0.3,  # Lower temperature for more focused, detailed output
+                messages=messages
             )
-            
-            summary = message.choices[0].message.content
-            logging.info(f"Generated detailed summary for {repo_name} ({len(summary)} chars)")
-            return summary
+            usage_ledger.record(repo or label, kind, model, message.usage, time.perf_counter() - start)
+            if truncated(message.choices[0].finish_reason, label, max_tokens, retry_max_tokens):
+                max_tokens = retry_max_tokens
+                continue
+            return message.choices[0].message.content
 
         except Exception as e:
             error_str = str(e)
             if '429' in error_str:
                 wait_time = (2 ** attempt) * 10
-                logging.warning(f"Rate limit hit for {repo_name}. Attempt {attempt + 1}/{max_retries}. Waiting {wait_time}s...")
+                logging.warning(f"Rate limit hit for {label}. Attempt {attempt + 1}/{max_retries}. Waiting {wait_time}s...")
                 time.sleep(wait_time)
             else:
-                logging.error(f"Failed to generate summary for {repo_name}: {e}")
+                logging.error(f"Failed to generate summary for {label}: {e}")
                 return None
 
-    logging.error(f"Max retries reached for {repo_name}")
+    logging.error(f"Max retries reached for {label}")
     return None
 
+def truncated(finish_reason, label, max_tokens, retry_max_tokens):
+    """True when a reply hit a max_tokens that can still be raised to `retry_max_tokens`; logs either way."""
+    if finish_reason != 'length':
+        return False
+    if retry_max_tokens and max_tokens < retry_max_tokens:
+        logging.warning(f"Reply for {label} was cut off at {max_tokens} tokens, retrying with {retry_max_tokens}...")
+        return True
+    logging.warning(f"Reply for {label} was cut off at {max_tokens} tokens")
+    return False
+
+def continuation_messages(messages, text):
+    """Ask the model to carry on from a reply that was cut off."""
+    return messages + [
+        {"role": "assistant", "content": text},
+        {"role": "user", "content": "Your reply was cut off. Continue exactly where it stopped, without repeating anything or adding a preamble."},
+    ]
+
+def stream_completion(messages, label, partial, max_tokens=MAX_TOKENS, max_retries=5, model=None,
+                      retry_max_tokens=None):
+    """
+    Like create_completion, but stream the reply into `partial` (a
+    PartialSummary) and commit it once the model finishes. Text left by an
+    interrupted run, or by a connection that drops mid-stream, is kept and
+    the model is asked to continue from it; so is a reply cut off at a
+    max_tokens below `retry_max_tokens`, up to that budget. Logs time to
+    first token and tokens/sec for every request.
+    """
+    model = model or MODEL
+    text = partial.resume()
+    if text:
+        logging.info(f"Resuming {label} from {len(text)} chars of a partial summary...")
+    partial.open(text)
+
+    attempt = 0
+    while attempt < max_retries:
+        remaining = max_tokens - count_tokens(text, model) if text else max_tokens
+        if remaining <= 0:
+            break
+        request = continuation_messages(messages, text) if text else messages
+        start = time.perf_counter()
+        first_token = None
+        usage = None
+        finish_reason = None
+        generated = ''
+        try:
+            stream = openai_client().chat.completions.create(
+                model=model,
+                max_tokens=remaining,
+                temperature=0.3,
+                messages=request,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finish_reason = chunk.choices[0].finish_reason
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                        metrics.record("openai ttfb", first_token - start)
+                    generated += delta
+                    partial.write(delta)
+            if finish_reason is None:
+                raise ConnectionError("stream ended without a finish reason")
+            text += generated
+            if truncated(finish_reason, label, max_tokens, retry_max_tokens):
+                max_tokens = retry_max_tokens
+                attempt += 1
+                continue
+            break
+
+        except Exception as e:
+            text += generated
+            error_str = str(e)
+            if '429' in error_str:
+                wait_time = (2 ** attempt) * 10
+                logging.warning(f"Rate limit hit for {label}. Attempt {attempt + 1}/{max_retries}. Waiting {wait_time}s...")
+                time.sleep(wait_time)
+            elif generated:
+                # The stream broke after making progress; keep it and ask for the rest
+                logging.warning(f"Stream for {label} broke after {len(generated)} chars ({e}), continuing...")
+            else:
+                logging.error(f"Failed to generate summary for {label}: {e}")
+                if text:
+                    partial.close()
+                else:
+                    partial.discard()
+                return None
+            attempt += 1
+        finally:
+            if usage is None and generated:
+                # A broken stream sends no usage, but its tokens were still billed
+                usage = {'prompt_tokens': estimate_tokens(request, 0), 'completion_tokens': count_tokens(generated, model)}
+            if usage is not None:
+                usage_ledger.record(label, 'summary', model, usage, time.perf_counter() - start)
+            if first_token is not None:
+                elapsed = time.perf_counter() - first_token
+                tokens = usage['completion_tokens'] if isinstance(usage, dict) else usage.completion_tokens
+                metrics.incr("openai streamed tokens", tokens)
+                logging.info(f"Streamed {label}: first token after {first_token - start:.2f}s, "
+                             f"{tokens} tokens at {tokens / elapsed if elapsed else 0:.1f} tok/s")
+    else:
+        logging.error(f"Max retries reached for {label}, keeping {len(text)} chars to resume from")
+        partial.close()
+        return None
+
+    if not text:
+        partial.discard()
+        return None
+    partial.commit()
+    return text
+
+def default_policy():
+    return SummaryPolicy('default', MODEL, MAX_TOKENS, PROMPT_EXHAUSTIVE)
+
+def summary_policy(docs, docs_content):
+    """Choose the model, output budget and prompt for packed docs (see policy.choose_policy)."""
+    return choose_policy(count_tokens(docs_content, MODEL), len(docs), MODEL, MAX_TOKENS)
+
+def record_policy(policy, docs_content):
+    """Count a summary request in policy_stats with what its tier saved against the default policy."""
+    instructions = INSTRUCTIONS.get(policy.prompt, SUMMARY_INSTRUCTIONS)
+    prompt_saved = count_tokens(SUMMARY_INSTRUCTIONS, MODEL) - count_tokens(instructions, MODEL)
+    policy_stats.record(policy, count_tokens(docs_content, MODEL), MAX_TOKENS - policy.max_tokens, prompt_saved)
+
+def use_sections(policy):
+    """
+    Section-parallel generation applies to the exhaustive prompt only, the
+    shorter ones fit a single request, and never in batch mode.
+    """
+    return (SECTION_PARALLEL and SUMMARY_MODE != 'batch' and policy.prompt == PROMPT_EXHAUSTIVE
+            and len(SUMMARY_SECTIONS) > 1)
+
+def section_label(repo_name, group):
+    return f"{repo_name} sections {group[0][0]}-{group[-1][0]}"
+
+def finish_sections(groups, replies, repo_name):
+    """Stitch section replies into one summary, or return None if any request failed or left out a section."""
+    if any(reply is None for reply in replies):
+        logging.warning(f"A section request failed for {repo_name}, summarizing in one request...")
+        return None
+    summary, missing = stitch_sections(groups, replies)
+    if missing:
+        logging.warning(f"Sections {', '.join(map(str, missing))} are missing from the replies for {repo_name}, "
+                        f"summarizing in one request...")
+        return None
+    return summary or None
+
+def summarize_sections(docs_content, repo_name, policy, max_retries=5):
+    """
+    Generate the summary as SECTION_BATCHES groups of sections requested
+    concurrently over the same docs, then stitch them together in section
+    order. Wall-clock time is that of the slowest group instead of the
+    whole summary. Returns None if any group fails.
+    """
+    groups = group_sections(SUMMARY_SECTIONS, SECTION_BATCHES)
+
+    def generate(group):
+        return create_completion(build_section_messages(docs_content, repo_name, group), section_label(repo_name, group),
+                                 section_budget(policy.max_tokens, group, len(SUMMARY_SECTIONS)), max_retries,
+                                 kind='sections', repo=repo_name, model=policy.model, retry_max_tokens=MAX_TOKENS)
+
+    with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+        replies = list(executor.map(generate, groups))
+    return finish_sections(groups, replies, repo_name)
+
+def summarize_docs(docs_content, repo_name, max_retries=5, policy=None):
+    """
+    Use OpenAI to summarize documentation content with retry logic.
+    `policy` sets the model, max_tokens and prompt variant (default: the
+    exhaustive prompt with MODEL and MAX_TOKENS). With SECTION_PARALLEL set
+    the sections are generated concurrently (see summarize_sections),
+    otherwise with SUMMARY_STREAM set the reply is streamed into
+    SUMMARY.md.partial.
+    """
+    if not docs_content.strip():
+        logging.warning(f"No content to summarize for {repo_name}")
+        return None
+
+    policy = policy or default_policy()
+    record_policy(policy, docs_content)
+    summary = None
+    if use_sections(policy):
+        summary = summarize_sections(docs_content, repo_name, policy, max_retries)
+    if summary is None:
+        messages = build_messages(docs_content, repo_name, policy.prompt)
+        if SUMMARY_STREAM:
+            key = content_digest(json.dumps(messages), policy.model, str(policy.max_tokens))
+            partial = PartialSummary(DOCS_DIR / repo_name / "SUMMARY.md", key, summary_header(repo_name))
+            summary = stream_completion(messages, repo_name, partial, policy.max_tokens, max_retries, policy.model,
+                                        retry_max_tokens=MAX_TOKENS)
+        else:
+            summary = create_completion(messages, repo_name, policy.max_tokens, max_retries, model=policy.model,
+                                        retry_max_tokens=MAX_TOKENS)
+    if summary:
+        logging.info(f"Generated detailed summary for {repo_name} ({len(summary)} chars)")
+    return summary
+
+def build_note_messages(chunk_text, repo_name, part, total):
+    """Build the map-step messages that turn one chunk of docs into notes; the fixed text comes first, as in build_messages."""
+    return [
+        {
+            "role": "system",
+            "content": "You are a technical documentation expert. You take dense, factual notes that another writer will later turn into a complete summary."
+        },
+        {
+            "role": "user",
+            "content": f"""Write detailed notes on the part of a repository's documentation given at the end of this message, and on that part only. Keep every concrete detail a reader of the final summary would need: features, architecture, installation steps, commands, configuration options with defaults, API names and signatures, version requirements, caveats and best practices. Keep important code snippets verbatim. Use terse markdown bullet points under short headings; do not add an introduction or conclusion.
+
+**Repository:** {repo_name}, part {part} of {total}
+
+**Documentation Part:**
+{chunk_text}"""
+        }
+    ]
+
+def note_cache_path(chunk_digest, repo_name):
+    key = hashlib.sha256(f"{NOTES_VERSION}\0{MODEL}\0{repo_name}\0{chunk_digest}".encode()).hexdigest()
+    return NOTES_CACHE_DIR / f"{key}.md"
+
+def chunk_label(repo_name, part, total):
+    return f"{repo_name} part {part}/{total}"
+
+def cached_notes(chunk, repo_name):
+    cache_file = note_cache_path(chunk['digest'], repo_name)
+    return cache_file.read_text(encoding='utf-8') if cache_file.exists() else None
+
+def store_notes(chunk, repo_name, notes):
+    if not notes:
+        return
+    cache_file = note_cache_path(chunk['digest'], repo_name)
+    NOTES_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix('.tmp')
+    tmp_file.write_text(notes, encoding='utf-8')
+    os.replace(tmp_file, cache_file)
+
+def summarize_chunk(chunk, repo_name, part, total):
+    """Return (notes, cached) for one chunk, reusing notes cached under its hash."""
+    notes = cached_notes(chunk, repo_name)
+    if notes is not None:
+        return notes, True
+
+    notes = create_completion(build_note_messages(chunk['text'], repo_name, part, total),
+                              chunk_label(repo_name, part, total), NOTE_MAX_TOKENS, kind='notes', repo=repo_name)
+    store_notes(chunk, repo_name, notes)
+    return notes, False
+
+def map_chunks(chunks, repo_name, workers=MAP_WORKERS):
+    """Summarize chunks concurrently; returns a list of (notes, cached) in chunk order."""
+    total = len(chunks)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            lambda indexed: summarize_chunk(indexed[1], repo_name, indexed[0], total),
+            enumerate(chunks, 1)
+        ))
+
+def reduce_level(level, chunks, results, repo_name, levels):
+    """
+    Log and record one map level in `levels`. Returns the notes as
+    (name, text) pairs for the next level, or None if a chunk has no notes.
+    """
+    cached = sum(1 for _, hit in results if hit)
+    logging.info(f"Map level {level} for {repo_name}: {len(chunks)} chunks, {cached} notes from cache")
+    levels.append({
+        'level': level,
+        'chunks': [
+            {'files': chunk['files'], 'tokens': chunk['tokens'], 'digest': chunk['digest'], 'cached': hit}
+            for chunk, (_, hit) in zip(chunks, results)
+        ],
+    })
+    if any(notes is None for notes, _ in results):
+        logging.error(f"Map step failed for {repo_name}, {sum(1 for n, _ in results if n is None)} chunks have no notes")
+        return None
+    return [(f"notes part {i}", notes) for i, (notes, _) in enumerate(results, 1)]
+
+def notes_fit(notes, budget):
+    return len(notes) == 1 or sum(count_tokens(text, MODEL) for _, text in notes) <= budget
+
+def pack_notes(notes, repo_dir, levels, budget):
+    """Pack the final notes into one prompt body and record the map levels in PACKING.json."""
+    notes_content, manifest = pack_docs(notes, MODEL, budget)
+    manifest['mode'] = 'map-reduce'
+    manifest['map_levels'] = levels
+    write_packing_manifest(repo_dir, manifest)
+    return notes_content
+
+def map_reduce_summarize(docs, repo_name, repo_dir, budget=DOCS_TOKEN_BUDGET, policy=None):
+    """
+    Summarize docs too large for one request. The docs are cut into
+    MAP_CHUNK_TOKENS chunks, each chunk is turned into notes (cached by
+    chunk hash), and the notes are reduced into the usual summary with
+    build_messages(). If the notes themselves exceed `budget` they are
+    chunked and condensed again, up to MAX_REDUCE_LEVELS times.
+    """
+    levels = []
+    current = docs
+    for level in range(1, MAX_REDUCE_LEVELS + 1):
+        chunks = chunk_docs(current, MODEL, MAP_CHUNK_TOKENS)
+        current = reduce_level(level, chunks, map_chunks(chunks, repo_name), repo_name, levels)
+        if current is None:
+            return None
+        if notes_fit(current, budget):
+            break
+    return summarize_docs(pack_notes(current, repo_dir, levels, budget), repo_name, policy=policy)
+
+def cached_summary(docs_digest, repo_name, policy=None):
+    """
+    Look up a summary for a docs digest under the current prompt version,
+    the policy's model, budget and prompt, and the section mode. Returns
+    (key, summary); summary is None on a miss and key is None when the
+    cache is disabled.
+    """
+    if summary_cache is None:
+        return None, None
+    policy = policy or default_policy()
+    # Section-parallel summaries read differently from single-request ones, so they are cached apart
+    mode = 'sections' if use_sections(policy) else 'single'
+    key = SummaryCache.key(docs_digest, f"{PROMPT_VERSION}:{policy.signature()}:{mode}", policy.model)
+    entry = summary_cache.get(key)
+    if entry is None:
+        summary_cache.record_miss()
+        return key, None
+    summary_cache.record_hit(entry)
+    logging.info(f"Summary cache hit for {repo_name}, ~{entry.get('tokens') or 0} tokens avoided")
+    return key, entry['summary']
+
+def store_summary(key, summary, input_tokens, repo_name):
+    """Cache a freshly generated summary with an estimate of the tokens it cost."""
+    if summary_cache is None or not key or not summary:
+        return
+    try:
+        summary_cache.put(key, summary, input_tokens + count_tokens(summary, MODEL), repo_name)
+    except OSError as e:
+        logging.error(f"Failed to cache summary for {repo_name}: {e}")
+
+def map_reduce_digest(docs):
+    """Digest of every doc a map-reduce summary reads, plus the settings that shape its chunks."""
+    return content_digest('map-reduce', NOTES_VERSION, str(MAP_CHUNK_TOKENS),
+                          *(part for rel_path, text in docs for part in (rel_path, text)))
+
+def use_map_reduce(docs, budget=DOCS_TOKEN_BUDGET):
+    if MAP_REDUCE == 'always':
+        return True
+    if MAP_REDUCE != 'auto':
+        return False
+    return sum(count_tokens(text, MODEL) for _, text in docs) > budget
+
+def build_patch_messages(summary, diff, repo_name):
+    """Build the messages asking for the sections of a summary that a docs diff affects."""
+    return [
+        {
+            "role": "system",
+            "content": "You are a technical documentation expert who keeps documentation summaries up to date. You change only what the documentation changes require."
+        },
+        {
+            "role": "user",
+            "content": f"""The documentation of a repository has changed since the summary below was written. The changes are given as a unified diff.
+
+**Instructions:**
+- Return ONLY the sections of the summary that must change because of the diff
+- Start each returned section with its heading line copied exactly from the current summary, then give the complete rewritten section
+- Keep the same level of detail, structure and markdown style as the current summary
+- If new material does not belong in any existing section, return it as a new section with a new heading
+- If no section needs to change, reply with exactly {NO_CHANGES}
+
+**Repository:** {repo_name}
+
+**Current Summary:**
+{summary}
+
+**Documentation Diff:**
+```diff
+{diff}
+```"""
+        }
+    ]
+
+def load_summary(repo_dir):
+    """Return the body of an existing SUMMARY.md (without the header save_summary adds), or None."""
+    summary_file = Path(repo_dir) / "SUMMARY.md"
+    if not summary_file.exists():
+        return None
+    text = summary_file.read_text(encoding='utf-8')
+    _, separator, body = text.partition("---\n\n")
+    return body if separator else text
+
+def plan_patch(docs, repo_name, repo_dir):
+    """
+    Decide whether the existing summary can be patched from a docs diff.
+    Returns None when a full summary is needed (no summary or snapshot yet,
+    patching disabled, or a diff above PATCH_MAX_DIFF_TOKENS),
+    (previous, None) when the docs have not changed at all, and
+    (previous, messages) with the patch request otherwise.
+    """
+    if not SUMMARY_PATCH:
+        return None
+    previous = load_summary(repo_dir)
+    snapshot = load_snapshot(repo_name)
+    if previous is None or snapshot is None:
+        return None
+
+    diff = docs_diff(snapshot, render_snapshot(docs))
+    if not diff:
+        logging.info(f"Docs for {repo_name} are unchanged since the last summary, keeping it.")
+        return previous, None
+    diff_tokens = count_tokens(diff, MODEL)
+    if diff_tokens > PATCH_MAX_DIFF_TOKENS:
+        logging.info(f"Docs diff for {repo_name} is {diff_tokens} tokens (limit {PATCH_MAX_DIFF_TOKENS}), "
+                     f"summarizing in full...")
+        return None
+    logging.info(f"Patching summary for {repo_name} from a {diff_tokens}-token docs diff...")
+    return previous, build_patch_messages(previous, diff, repo_name)
+
+def finish_patch(previous, reply, repo_name):
+    """Apply a patch reply to the previous summary; None means fall back to a full summary."""
+    if reply is None or previous is None:
+        return None
+    summary = apply_section_patch(previous, reply)
+    if summary is None:
+        logging.warning(f"Could not apply the summary patch for {repo_name}, summarizing in full...")
+    return summary
+
+def plan_summary(docs, repo_name, repo_dir):
+    """
+    Pack the docs (or pick map-reduce when they don't fit), choose a summary
+    policy and look them up in the summary cache. Returns (key, summary,
+    docs_content, input_tokens, policy); summary is the cached one or None,
+    docs_content is None for map-reduce.
+    """
+    if use_map_reduce(docs):
+        logging.info(f"Docs for {repo_name} exceed the token budget, using map-reduce...")
+        input_tokens = sum(count_tokens(text, MODEL) for _, text in docs)
+        policy = choose_policy(input_tokens, len(docs), MODEL, MAX_TOKENS)
+        key, summary = cached_summary(map_reduce_digest(docs), repo_name, policy)
+        return key, summary, None, input_tokens, policy
+
+    docs_content = pack_repo_docs(docs, repo_dir)
+    policy = summary_policy(docs, docs_content)
+    logging.info(f"Summary policy for {repo_name}: {policy.tier} tier, {policy.model}, "
+                 f"max_tokens={policy.max_tokens}, {policy.prompt} prompt")
+    key, summary = cached_summary(content_digest(docs_content), repo_name, policy)
+    return key, summary, docs_content, count_tokens(docs_content, MODEL), policy
+
+def summarize_repo_docs(docs_files, repo_name, repo_dir):
+    """
+    Summarize a repo's docs: from the summary cache, by patching the
+    previous summary when its docs diff is small, or in full (one request,
+    or map-reduce when the docs don't fit). Returns (docs, summary).
+    """
+    docs = load_docs(docs_files, repo_dir)
+    key, summary, docs_content, input_tokens, policy = plan_summary(docs, repo_name, repo_dir)
+    if summary is None:
+        patch = plan_patch(docs, repo_name, repo_dir)
+        if patch:
+            previous, messages = patch
+            summary = previous if messages is None else finish_patch(
+                previous, create_completion(messages, repo_name, kind='patch'), repo_name)
+        if summary is None:
+            if docs_content is None:
+                summary = map_reduce_summarize(docs, repo_name, repo_dir, policy=policy)
+            else:
+                summary = summarize_docs(docs_content, repo_name, policy=policy)
+        store_summary(key, summary, input_tokens, repo_name)
+    return docs, summary
+
+def record_summary(full_repo_name, summary, metadata, docs, snapshot_digest=None):
+    """
+    Save SUMMARY.md, METADATA.json and the docs snapshot the summary was
+    built from. With `snapshot_digest` (the digest of the snapshot a batch
+    request was built from), docs that changed since are not saved as the
+    snapshot; the previous one is kept so the next run still sees the change.
+    """
+    with metrics.timer("stage save"):
+        if not save_summary(summary, full_repo_name, DOCS_DIR):
+            return False
+        if metadata:
+            save_repo_metadata(DOCS_DIR / full_repo_name, metadata)
+        snapshot = render_snapshot(docs)
+        if snapshot_digest and content_digest(snapshot) != snapshot_digest:
+            logging.warning(f"Docs of {full_repo_name} changed after its batch request was built, "
+                            f"keeping the previous snapshot")
+            return True
+        try:
+            save_snapshot(full_repo_name, snapshot)
+        except OSError as e:
+            logging.error(f"Failed to save docs snapshot for {full_repo_name}: {e}")
+        return True
+
+def estimate_tokens(messages, max_tokens=MAX_TOKENS):
+    """
+    Rough token count of a request as rate limits see it: about four
+    characters per prompt token plus the completion budget.
+    """
+    prompt_chars = sum(len(m["content"]) for m in messages)
+    return prompt_chars // 4 + max_tokens
+
+async def complete_async(aclient, limiter, messages, label, max_tokens=MAX_TOKENS, max_retries=5, kind='summary',
+                         repo=None, model=None, retry_max_tokens=None):
+    """
+    Async variant of create_completion. Waits on the shared RPM/TPM limiter
+    before every attempt instead of sleeping a fixed interval.
+    """
+    model = model or MODEL
+    estimate = estimate_tokens(messages, max_tokens)
+    for attempt in range(max_retries):
+        await limiter.acquire(estimate)
+        try:
+            start = time.perf_counter()
+            message = await aclient.chat.completions.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=0.3,
+                messages=messages
+            )
+            usage = message.usage
+            usage_ledger.record(repo or label, kind, model, usage, time.perf_counter() - start)
+            limiter.record(usage.total_tokens if usage else estimate)
+            if truncated(message.choices[0].finish_reason, label, max_tokens, retry_max_tokens):
+                max_tokens = retry_max_tokens
+                estimate = estimate_tokens(messages, max_tokens)
+                continue
+            return message.choices[0].message.content
+
+        except Exception as e:
+            if '429' in str(e):
+                wait_time = (2 ** attempt) * 10
+                logging.warning(f"Rate limit hit for {label}. Attempt {attempt + 1}/{max_retries}. Waiting {wait_time}s...")
+                await asyncio.sleep(wait_time)
+            else:
+                logging.error(f"Failed to generate summary for {label}: {e}")
+                return None
+
+    logging.error(f"Max retries reached for {label}")
+    return None
+
+async def summarize_docs_async(aclient, limiter, docs_content, repo_name, max_retries=5, policy=None):
+    """Async variant of summarize_docs."""
+    if not docs_content.strip():
+        logging.warning(f"No content to summarize for {repo_name}")
+        return None
+
+    policy = policy or default_policy()
+    record_policy(policy, docs_content)
+    summary = None
+    if use_sections(policy):
+        groups = group_sections(SUMMARY_SECTIONS, SECTION_BATCHES)
+        replies = await asyncio.gather(*(
+            complete_async(aclient, limiter, build_section_messages(docs_content, repo_name, group),
+                           section_label(repo_name, group),
+                           section_budget(policy.max_tokens, group, len(SUMMARY_SECTIONS)), max_retries,
+                           kind='sections', repo=repo_name, model=policy.model, retry_max_tokens=MAX_TOKENS)
+            for group in groups
+        ))
+        summary = finish_sections(groups, replies, repo_name)
+    if summary is None:
+        summary = await complete_async(aclient, limiter, build_messages(docs_content, repo_name, policy.prompt), repo_name,
+                                       policy.max_tokens, max_retries, model=policy.model, retry_max_tokens=MAX_TOKENS)
+    if summary:
+        logging.info(f"Generated detailed summary for {repo_name} ({len(summary)} chars)")
+    return summary
+
+async def summarize_chunk_async(aclient, limiter, semaphore, chunk, repo_name, part, total):
+    """Async variant of summarize_chunk; the request waits on the shared RPM/TPM limiter."""
+    notes = await asyncio.to_thread(cached_notes, chunk, repo_name)
+    if notes is not None:
+        return notes, True
+    async with semaphore:
+        notes = await complete_async(aclient, limiter, build_note_messages(chunk['text'], repo_name, part, total),
+                                     chunk_label(repo_name, part, total), NOTE_MAX_TOKENS, kind='notes',
+                                     repo=repo_name)
+    await asyncio.to_thread(store_notes, chunk, repo_name, notes)
+    return notes, False
+
+async def map_reduce_summarize_async(aclient, limiter, docs, repo_name, repo_dir, budget=DOCS_TOKEN_BUDGET,
+                                     policy=None):
+    """Async variant of map_reduce_summarize, with up to MAP_WORKERS map requests in flight."""
+    semaphore = asyncio.Semaphore(MAP_WORKERS)
+    levels = []
+    current = docs
+    for level in range(1, MAX_REDUCE_LEVELS + 1):
+        chunks = await asyncio.to_thread(chunk_docs, current, MODEL, MAP_CHUNK_TOKENS)
+        results = await asyncio.gather(*(
+            summarize_chunk_async(aclient, limiter, semaphore, chunk, repo_name, part, len(chunks))
+            for part, chunk in enumerate(chunks, 1)
+        ))
+        current = reduce_level(level, chunks, results, repo_name, levels)
+        if current is None:
+            return None
+        if notes_fit(current, budget):
+            break
+    notes_content = await asyncio.to_thread(pack_notes, current, repo_dir, levels, budget)
+    return await summarize_docs_async(aclient, limiter, notes_content, repo_name, policy=policy)
+
+async def summarize_all_async(pending, metadata_by_url, concurrency=SUMMARY_CONCURRENCY):
+    """
+    Summarize (repo_url, docs_files) pairs with up to `concurrency` requests
+    in flight, saving each summary as soon as it arrives. Logs the achieved
+    requests/min and tokens/min at the end.
+    """
+    aclient = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    limiter = RateLimiter(OPENAI_RPM, OPENAI_TPM)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(repo_url, docs_files):
+        parts = repo_url.rstrip('/').split('/')
+        full_repo_name = f"{parts[-2]}_{parts[-1]}"
+        repo_dir = DOCS_DIR / full_repo_name
+        async with semaphore:
+            start = time.perf_counter()
+            docs = await asyncio.to_thread(load_docs, docs_files, repo_dir)
+            key, summary, docs_content, input_tokens, policy = await asyncio.to_thread(
+                plan_summary, docs, full_repo_name, repo_dir)
+            if summary is None:
+                patch = await asyncio.to_thread(plan_patch, docs, full_repo_name, repo_dir)
+                if patch:
+                    previous, messages = patch
+                    if messages is None:
+                        summary = previous
+                    else:
+                        reply = await complete_async(aclient, limiter, messages, full_repo_name, kind='patch')
+                        summary = finish_patch(previous, reply, full_repo_name)
+                if summary is None:
+                    if docs_content is None:
+                        summary = await map_reduce_summarize_async(aclient, limiter, docs, full_repo_name, repo_dir,
+                                                                   policy=policy)
+                    else:
+                        summary = await summarize_docs_async(aclient, limiter, docs_content, full_repo_name,
+                                                             policy=policy)
+                store_summary(key, summary, input_tokens, full_repo_name)
+            metrics.record("stage summarize", time.perf_counter() - start)
+        if summary:
+            record_summary(full_repo_name, summary, metadata_by_url.get(repo_url), docs)
+        return repo_url, summary
+
+    tasks = [asyncio.create_task(run(repo_url, docs_files)) for repo_url, docs_files in pending]
+    done = 0
+    try:
+        for i, task in enumerate(asyncio.as_completed(tasks), 1):
+            repo_url, summary = await task
+            done += 1 if summary else 0
+            logging.info(f"[{i}/{len(tasks)}] Finished {repo_url}")
+    finally:
+        await aclient.close()
+
+    rpm, tpm = limiter.achieved()
+    logging.info(f"Summarized {done}/{len(tasks)} repositories at {rpm:.1f} requests/min, "
+                 f"{tpm:.0f} tokens/min (limits: {OPENAI_RPM} RPM, {OPENAI_TPM} TPM)")
+    return done
+
+def summary_header(repo_name):
+    return (f"# Detailed Summary: {repo_name}\n\n"
+            f"*Auto-generated comprehensive documentation summary*\n\n"
+            "---\n\n")
+
 def save_summary(summary, repo_name, destination):
     """
-    Save the summary to a file.
+    Save the summary to a file. It is written next to SUMMARY.md and
+    renamed over it, so the file is never left half-written.
     """
     dest_dir = Path(destination) / repo_name
     dest_dir.mkdir(parents=True, exist_ok=True)
     
     summary_file = dest_dir / "SUMMARY.md"
     try:
-        with open(summary_file, 'w', encoding='utf-8') as f:
-            f.write(f"# Detailed Summary: {repo_name}\n\n")
-            f.write(f"*Auto-generated comprehensive documentation summary*\n\n")
-            f.write("---\n\n")
-            f.write(summary)
+        partial = PartialSummary(summary_file, None, summary_header(repo_name))
+        partial.open(summary)
+        partial.commit()
         logging.info(f"Saved detailed summary to {summary_file} ({len(summary)} chars)")
         return True
     except Exception as e:
         logging.error(f"Failed to save summary for {repo_name}: {e}")
         return False
 
-def process_repo_with_summary(repo_url):
+def prepare_repo_docs(repo_url, metadata=None):
+    """
+    Make sure the docs for a repository are in DOCS_DIR and decide whether
+    it needs a summary. Returns (ok, docs_files); docs_files is None when
+    there is nothing to summarize (up-to-date summary, no docs, or failure).
+    """
     parts = repo_url.rstrip('/').split('/')
     owner = parts[-2]
     repo_name = parts[-1]
@@ -222,51 +1075,249 @@ def process_repo_with_summary(repo_url):
     dest_dir = DOCS_DIR / full_repo_name
     summary_file = dest_dir / "SUMMARY.md"
 
-    # If summary already exists, skip entirely
+    # If summary exists and the default branch hasn't moved, skip entirely
     if summary_file.exists():
-        logging.info(f"Summary already exists for {owner}/{repo_name}, skipping.")
-        return True
+        stored = load_repo_metadata(dest_dir)
+        if needs_refresh(stored, metadata):
+            logging.info(f"HEAD moved for {owner}/{repo_name} "
+                         f"({stored['head_oid'][:7]} -> {metadata['head_oid'][:7]}), refreshing docs...")
+            for doc_file in list_repo_docs(dest_dir):
+                doc_file.unlink()
+        elif FORCE_SUMMARY:
+            logging.info(f"FORCE_SUMMARY is set, summarizing {owner}/{repo_name} again...")
+        else:
+            if metadata and not stored:
+                save_repo_metadata(dest_dir, metadata)
+            logging.info(f"Summary up to date for {owner}/{repo_name}, skipping.")
+            return True, None
 
     # If docs exist, just generate summary from existing docs
-    if dest_dir.exists() and any(dest_dir.iterdir()):
+    docs_files = list_repo_docs(dest_dir) if dest_dir.exists() else []
+    if docs_files:
         logging.info(f"Docs exist for {owner}/{repo_name}, generating summary only...")
-        docs_files = list(dest_dir.rglob('*'))
-        docs_files = [f for f in docs_files if f.is_file() and f.name != 'SUMMARY.md']
-        docs_content = read_docs_content(docs_files)
-        summary = summarize_docs(docs_content, full_repo_name)
-        if summary:
-            save_summary(summary, full_repo_name, DOCS_DIR)
-        return True
+        return True, docs_files
 
-    # Otherwise clone, copy docs, and generate summary
-    clone_path = CLONE_DIR / full_repo_name
-    if clone_path.exists():
-        shutil.rmtree(clone_path, onerror=handle_remove_readonly)
+    # Otherwise clone (or download) and copy docs
+    with metrics.timer("stage fetch docs"):
+        ok, found = fetch_repo_docs(repo_url, full_repo_name)
+    if not ok:
+        return False, None
 
-    if not clone_repo(repo_url, clone_path):
-        return False
-    
-    docs_files = find_docs(clone_path)
+    docs_files = list_repo_docs(dest_dir) if found else []
+    if not docs_files and metadata and summary_file.exists():
+        # Nothing to summarize at this HEAD; record it so the repo isn't fetched again next run
+        save_repo_metadata(dest_dir, metadata)
+    return True, docs_files or None
 
-    if not docs_files:
-        logging.warning(f"No documentation found for {repo_name}")
-        return True
-        
-    logging.info(f"Found {len(docs_files)} documentation files")
-    copy_docs(docs_files, full_repo_name, DOCS_DIR, clone_path)
-        
-    docs_content = read_docs_content(docs_files)
-    summary = summarize_docs(docs_content, full_repo_name)
+def summarize_repo(repo_url, docs_files, metadata=None):
+    """Summarize prepared docs and save SUMMARY.md (and METADATA.json)."""
+    parts = repo_url.rstrip('/').split('/')
+    full_repo_name = f"{parts[-2]}_{parts[-1]}"
+
+    with metrics.timer("stage summarize"):
+        docs, summary = summarize_repo_docs(docs_files, full_repo_name, DOCS_DIR / full_repo_name)
     if summary:
-        save_summary(summary, full_repo_name, DOCS_DIR)
-    
-    try:
-        shutil.rmtree(clone_path, onerror=handle_remove_readonly)
-        logging.info(f"Cleaned up temporary files for {repo_name}")
-    except Exception as e:
-        logging.error(f"Failed to cleanup {clone_path}: {e}")
-    
-    return True
+        record_summary(full_repo_name, summary, metadata, docs)
+    return summary
+
+def summarize_all(pending, metadata_by_url):
+    """Summarize (repo_url, docs_files) pairs one at a time, pausing between calls."""
+    for i, (repo_url, docs_files) in enumerate(pending, 1):
+        logging.info(f"[{i}/{len(pending)}] Summarizing {repo_url}")
+        misses = summary_cache.misses if summary_cache else None
+        summarize_repo(repo_url, docs_files, metadata_by_url.get(repo_url))
+
+        # A cache hit made no API call, so there is nothing to wait for
+        if summary_cache and summary_cache.misses == misses:
+            continue
+        if i < len(pending):
+            wait_time = 60
+            logging.info(f"Waiting {wait_time}s before next repo to avoid rate limits...")
+            time.sleep(wait_time)
+
+def load_batch_state():
+    if BATCH_STATE_FILE.exists():
+        with open(BATCH_STATE_FILE, 'r') as f:
+            return json.load(f)
+    return None
+
+def save_batch_state(state):
+    tmp_file = BATCH_STATE_FILE.with_suffix('.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(state, indent=2, fp=f)
+    os.replace(tmp_file, BATCH_STATE_FILE)
+
+def build_batch_file(pending, metadata_by_url):
+    """
+    Build the Batch API input for (repo_url, docs_files) pairs. Returns
+    (jsonl_bytes, requests) where requests maps each custom_id (the
+    owner_repo folder name) to what is needed to save its result later.
+    Repos with a summary cache hit or unchanged docs are saved right away
+    and left out; repos with a small docs diff get a patch request.
+    """
+    lines = []
+    requests = {}
+    for repo_url, docs_files in pending:
+        parts = repo_url.rstrip('/').split('/')
+        full_repo_name = f"{parts[-2]}_{parts[-1]}"
+        repo_dir = DOCS_DIR / full_repo_name
+        docs = load_docs(docs_files, repo_dir)
+        docs_content = pack_repo_docs(docs, repo_dir)
+        if not docs_content.strip():
+            logging.warning(f"No content to summarize for {full_repo_name}")
+            continue
+        policy = summary_policy(docs, docs_content)
+        key, summary = cached_summary(content_digest(docs_content), full_repo_name, policy)
+        patch = plan_patch(docs, full_repo_name, repo_dir) if summary is None else None
+        if patch and patch[1] is None:
+            summary = patch[0]
+        if summary is not None:
+            record_summary(full_repo_name, summary, metadata_by_url.get(repo_url), docs)
+            continue
+
+        if patch:
+            messages, model, max_tokens = patch[1], MODEL, MAX_TOKENS
+        else:
+            record_policy(policy, docs_content)
+            messages = build_messages(docs_content, full_repo_name, policy.prompt)
+            model, max_tokens = policy.model, policy.max_tokens
+        lines.append(json.dumps({
+            "custom_id": full_repo_name,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "max_tokens": max_tokens,
+                "temperature": 0.3,
+                "messages": messages,
+            },
+        }))
+        requests[full_repo_name] = {
+            "repo_url": repo_url,
+            "metadata": metadata_by_url.get(repo_url),
+            "cache_key": key,
+            "input_tokens": count_tokens(docs_content, MODEL),
+            "max_tokens": max_tokens,
+            "snapshot_digest": content_digest(render_snapshot(docs)),
+            "patch": bool(patch),
+        }
+    return "\n".join(lines).encode('utf-8') + b"\n", requests
+
+def submit_batch(pending, metadata_by_url):
+    """Upload one JSONL request per repo, start a batch and persist its id."""
+    jsonl, requests = build_batch_file(pending, metadata_by_url)
+    if not requests:
+        return None
+
+    input_file = openai_client().files.create(file=("summaries.jsonl", io.BytesIO(jsonl)), purpose="batch")
+    batch = openai_client().batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    state = {
+        "batch_id": batch.id,
+        "input_file_id": input_file.id,
+        "submitted_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "requests": requests,
+    }
+    save_batch_state(state)
+    logging.info(f"Submitted batch {batch.id} with {len(requests)} requests ({len(jsonl)} bytes)")
+    return state
+
+def wait_for_batch(batch_id, max_wait=BATCH_MAX_WAIT, poll_interval=BATCH_POLL_INTERVAL):
+    """Poll a batch until it reaches a final status or max_wait runs out; returns the batch."""
+    deadline = time.monotonic() + max_wait
+    while True:
+        batch = openai_client().batches.retrieve(batch_id)
+        counts = batch.request_counts
+        progress = f" ({counts.completed + counts.failed}/{counts.total})" if counts else ""
+        logging.info(f"Batch {batch_id} is {batch.status}{progress}")
+        if batch.status in BATCH_DONE_STATUSES or time.monotonic() + poll_interval > deadline:
+            return batch
+        time.sleep(poll_interval)
+
+def collect_batch(state, batch):
+    """
+    Save a summary for every successful line of a finished batch and return
+    the set of repo URLs that got one. Failed lines are logged and left for
+    the next run to resubmit.
+    """
+    saved = set()
+    if batch.output_file_id:
+        output = openai_client().files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            full_repo_name = result["custom_id"]
+            request = state["requests"].get(full_repo_name)
+            response = result.get("response") or {}
+            if request is None:
+                continue
+            if result.get("error") or response.get("status_code") != 200:
+                logging.error(f"Batch request failed for {full_repo_name}: {result.get('error') or response.get('body')}")
+                continue
+
+            repo_dir = DOCS_DIR / full_repo_name
+            usage_ledger.record(full_repo_name, 'patch' if request.get("patch") else 'summary',
+                                response["body"].get("model") or MODEL,
+                                response["body"].get("usage"), batch=True)
+            choice = response["body"]["choices"][0]
+            summary = choice["message"]["content"]
+            # A batch reply cut off at its budget can't be retried in this run; save it but keep it out of the cache
+            cut_off = truncated(choice.get("finish_reason"), full_repo_name, request.get("max_tokens", MAX_TOKENS), None)
+            if request.get("patch"):
+                # Left unsaved, the repo is still stale and gets a new request next run
+                summary = finish_patch(load_summary(repo_dir), summary, full_repo_name)
+            if not summary:
+                continue
+            if not cut_off:
+                store_summary(request.get("cache_key"), summary, request.get("input_tokens", 0), full_repo_name)
+            docs = load_docs(list_repo_docs(repo_dir), repo_dir)
+            if record_summary(full_repo_name, summary, request["metadata"], docs, request.get("snapshot_digest")):
+                saved.add(request["repo_url"])
+
+    if batch.error_file_id:
+        errors = openai_client().files.content(batch.error_file_id).text
+        for line in errors.splitlines():
+            if line.strip():
+                result = json.loads(line)
+                logging.error(f"Batch request failed for {result.get('custom_id')}: {result.get('error') or result.get('response')}")
+
+    logging.info(f"Batch {batch.id} {batch.status}: saved {len(saved)}/{len(state['requests'])} summaries")
+    return saved
+
+def summarize_all_batch(pending, metadata_by_url):
+    """
+    Summarize through the Batch API. A batch left running by an earlier run
+    is collected first; if it is still not finished, nothing new is submitted
+    this run. Otherwise the remaining repos go out as one new batch, which is
+    waited on for up to BATCH_MAX_WAIT seconds and then left for the next run.
+    """
+    state = load_batch_state()
+    if state:
+        logging.info(f"Resuming batch {state['batch_id']} submitted at {state['submitted_at']}")
+        batch = wait_for_batch(state['batch_id'])
+        if batch.status not in BATCH_DONE_STATUSES:
+            logging.info(f"Batch {batch.id} still {batch.status}, will check again next run.")
+            return
+        saved = collect_batch(state, batch)
+        BATCH_STATE_FILE.unlink()
+        pending = [(repo_url, docs_files) for repo_url, docs_files in pending if repo_url not in saved]
+
+    if not pending:
+        return
+
+    state = submit_batch(pending, metadata_by_url)
+    if not state:
+        return
+    batch = wait_for_batch(state['batch_id'])
+    if batch.status not in BATCH_DONE_STATUSES:
+        logging.info(f"Batch {batch.id} still {batch.status}, will collect it next run.")
+        return
+    collect_batch(state, batch)
+    BATCH_STATE_FILE.unlink()
 
 def fetch_all_starred_docs_with_summary():
     """Fetch documentation and generate summaries for all starred repositories."""
@@ -274,28 +1325,42 @@ def fetch_all_starred_docs_with_summary():
     CLONE_DIR.mkdir(parents=True, exist_ok=True)
 
     logging.info("Fetching starred repositories...")
-    starred_repos = get_starred_repo_urls()
+    starred, removed = sync_starred_repos()
+    prune_unstarred(removed)
+    starred_repos = [entry['html_url'] for entry in starred]
     logging.info(f"Found {len(starred_repos)} starred repositories.\n")
 
-    success_count = 0
-    for i, repo_url in enumerate(starred_repos, 1):
-        logging.info(f"[{i}/{len(starred_repos)}] {repo_url}")
-        if process_repo_with_summary(repo_url):
-            success_count += 1
-        
-        if i < len(starred_repos):
-            parts = repo_url.rstrip('/').split('/')
-            full_repo_name = f"{parts[-2]}_{parts[-1]}"
-            summary_file = DOCS_DIR / full_repo_name / "SUMMARY.md"
-            
-            if not summary_file.exists():
-                wait_time = 60
-                logging.info(f"Waiting {wait_time}s before next repo to avoid rate limits...")
-                time.sleep(wait_time)
+    repo_metadata = fetch_repo_metadata([entry['repo'] for entry in starred])
+    metadata_by_url = {entry['html_url']: repo_metadata.get(entry['repo']) for entry in starred}
+
+    # Clone and copy docs for several repos at once; the clones are
+    # network-bound, the summaries below are rate-limited separately
+    prepared = run_pool(lambda url: prepare_repo_docs(url, metadata_by_url[url]), starred_repos)
 
     if CLONE_DIR.exists():
         shutil.rmtree(CLONE_DIR, onerror=handle_remove_readonly)
 
+    success_count = sum(1 for result in prepared if result and result[0])
+    pending = [
+        (repo_url, result[1])
+        for repo_url, result in zip(starred_repos, prepared)
+        if result and result[1]
+    ]
+    logging.info(f"{len(pending)} repositories need a summary.")
+
+    if SUMMARY_MODE == 'async':
+        asyncio.run(summarize_all_async(pending, metadata_by_url))
+    elif SUMMARY_MODE == 'batch':
+        summarize_all_batch(pending, metadata_by_url)
+    else:
+        summarize_all(pending, metadata_by_url)
+
+    if summary_cache:
+        summary_cache.report()
+    usage_ledger.report()
+    policy_stats.report()
+    metrics.report("openai ")
+    metrics.report("stage ")
     logging.info(f"\nComplete! Processed {success_count}/{len(starred_repos)} repositories.")
     logging.info(f"Documentation saved to: {DOCS_DIR.absolute()}")
 
@@ -0,0 +1,140 @@
+import os
+import re
+
+COMPACT_DOCS = os.getenv('COMPACT_DOCS', '1') != '0'
+# Bare URLs longer than this are cut down to host and the start of the path
+MAX_URL_CHARS = 60
+MARKDOWN_SUFFIXES = {'.md', '.markdown', '.mdx'}
+
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+# Badges first so the inner image doesn't leave an empty link behind
+BADGE_RE = re.compile(r'\[!\[[^\]]*\]\([^)]*\)\]\([^)]*\)')
+IMAGE_RE = re.compile(r'!\[[^\]]*\]\([^)]*\)|!\[[^\]]*\]\[[^\]]*\]')
+DATA_URI_RE = re.compile(r'data:[\w/+.-]+;base64,[A-Za-z0-9+/=]+')
+LINK_RE = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+REF_LINK_RE = re.compile(r'\[([^\]]+)\]\[[^\]]*\]')
+LINK_DEFINITION_RE = re.compile(r'^\s{0,3}\[[^\]]+\]:\s*\S+')
+AUTOLINK_RE = re.compile(r'<(https?://[^>\s]+)>')
+BARE_URL_RE = re.compile(r'https?://[^\s)<>\]"\']+')
+HTML_COMMENT_START = '<!--'
+HTML_COMMENT_END = '-->'
+# Only real HTML tags; prose placeholders like <your-token> or <path> stay
+HTML_TAGS = (
+    'a abbr b big blockquote br center code dd del details div dl dt em figcaption figure font h1 h2 h3 h4 h5 h6 '
+    'hr i img ins kbd li ol p picture pre s samp small source span strike strong sub summary sup table tbody td '
+    'tfoot th thead tr tt u ul video'
+).split()
+HTML_TAG_RE = re.compile(r'</?(?:' + '|'.join(HTML_TAGS) + r')(?=[\s/>])(?:\s[^<>]*)?/?>', re.I)
+TOC_HEADING_RE = re.compile(r'^#{1,6}\s*(table of contents|contents|toc|index)\s*:?\s*$', re.I)
+TOC_ENTRY_RE = re.compile(r'^\s*(?:[-*+]|\d+\.)\s+\[[^\]]*\]\(#[^)]*\)\s*$')
+RULE_RE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+SHORTCODE_RE = re.compile(r'(?<!\S):[a-z][a-z0-9_+-]*:(?!\S)')
+INLINE_CODE_RE = re.compile(r'(`[^`]*`)')
+EMOJI_RE = re.compile(
+    '[\U0001F000-\U0001FAFF\U00002600-\U000027BF\U0001F1E6-\U0001F1FF\U00002B00-\U00002BFF'
+    '\U0000FE0F\U0000200D\U000020E3]'
+)
+SPACES_RE = re.compile(r'[ \t]{2,}')
+
+def shorten_url(match):
+    url = match.group(0).split('://', 1)[-1].split('?', 1)[0].split('#', 1)[0].rstrip('/')
+    return url if len(url) <= MAX_URL_CHARS else url[:MAX_URL_CHARS] + '...'
+
+def compact_line(line):
+    """Strip images, badges, link targets, HTML tags and emoji from one line of prose, leaving inline code alone."""
+    if '`' in line:
+        parts = INLINE_CODE_RE.split(line)
+        line = ''.join(part if i % 2 else compact_prose(part) for i, part in enumerate(parts))
+    else:
+        line = compact_prose(line)
+    return squeeze_spaces(line)
+
+def squeeze_spaces(line):
+    """Collapse runs of spaces inside a line, keeping its indentation (it nests lists and reST blocks)."""
+    body = line.lstrip(' \t')
+    return line[:len(line) - len(body)] + SPACES_RE.sub(' ', body).rstrip()
+
+def compact_prose(line):
+    if DATA_URI_RE.search(line):
+        line = DATA_URI_RE.sub('', line)
+    line = BADGE_RE.sub('', line)
+    line = IMAGE_RE.sub('', line)
+    line = LINK_RE.sub(r'\1', line)
+    line = REF_LINK_RE.sub(r'\1', line)
+    line = AUTOLINK_RE.sub(shorten_url, line)
+    line = BARE_URL_RE.sub(shorten_url, line)
+    line = HTML_TAG_RE.sub('', line)
+    line = SHORTCODE_RE.sub('', line)
+    return EMOJI_RE.sub('', line)
+
+def compact_markdown(lines):
+    """
+    Rewrite markdown lines into a lean form, one line at a time. Fenced
+    code is passed through untouched; everywhere else badges, images, link
+    URLs, HTML tags and comments, tables of contents, horizontal rules and
+    emoji are dropped and blank lines are collapsed. Yields output lines.
+    """
+    in_fence = False
+    in_comment = False
+    blank = True
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if in_fence:
+            if FENCE_RE.match(line):
+                in_fence = False
+            yield line.rstrip()
+            continue
+        if FENCE_RE.match(line):
+            in_fence = True
+            blank = False
+            yield line.strip()
+            continue
+
+        if in_comment:
+            end = line.find(HTML_COMMENT_END)
+            if end == -1:
+                continue
+            in_comment = False
+            line = line[end + len(HTML_COMMENT_END):]
+        while HTML_COMMENT_START in line:
+            start = line.find(HTML_COMMENT_START)
+            end = line.find(HTML_COMMENT_END, start + len(HTML_COMMENT_START))
+            if end == -1:
+                in_comment = True
+                line = line[:start]
+                break
+            line = line[:start] + line[end + len(HTML_COMMENT_END):]
+
+        # TOC headings and entries (list items that only link within the page) carry no content
+        if TOC_HEADING_RE.match(line.strip()) or TOC_ENTRY_RE.match(line):
+            continue
+        if LINK_DEFINITION_RE.match(line) or RULE_RE.match(line):
+            continue
+
+        line = compact_line(line)
+        if not line.strip():
+            if not blank:
+                blank = True
+                yield ''
+            continue
+        blank = False
+        yield line
+
+def compact_plain(lines):
+    """Whitespace and emoji cleanup for text that isn't markdown (reST, extracted PDF/DOCX)."""
+    blank = True
+    for line in lines:
+        line = squeeze_spaces(EMOJI_RE.sub('', line.rstrip('\r\n')))
+        if not line.strip():
+            if not blank:
+                blank = True
+                yield ''
+            continue
+        blank = False
+        yield line
+
+def compact_text(text, suffix='.md'):
+    """Compact a whole document; markdown gets the full treatment, other text only whitespace cleanup."""
+    lines = text.splitlines()
+    compacted = compact_markdown(lines) if suffix.lower() in MARKDOWN_SUFFIXES else compact_plain(lines)
+    return '\n'.join(compacted).strip('\n')
@@ -0,0 +1,175 @@
+import os
+import re
+import hashlib
+import logging
+from collections import defaultdict
+from packing import rank_docs, is_translation
+from pathlib import PurePosixPath
+
+DEDUPE_DOCS = os.getenv('DEDUPE_DOCS', '1') != '0'
+# Estimated Jaccard similarity at or above which a doc counts as a copy of one already kept
+DEDUPE_THRESHOLD = float(os.getenv('DEDUPE_THRESHOLD', '0.8'))
+# Translated docs are compared on code and links only; translators often rewrite comments and samples
+TRANSLATION_THRESHOLD = float(os.getenv('TRANSLATION_THRESHOLD', '0.3'))
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+LSH_BANDS = 32
+# 64 bands of 2 rows make a pair at TRANSLATION_THRESHOLD a candidate with probability
+# 1-(1-0.3^2)^64 = 0.998; the 4-row bands above only reach 0.23 there
+STRUCTURE_LSH_BANDS = 64
+# Docs with fewer shingles than this are too small to compare reliably
+MIN_SHINGLES = 8
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+URL_RE = re.compile(r'\]\(([^)\s]+)|(https?://[^\s)<>"\']+)')
+INLINE_CODE_RE = re.compile(r'`([^`\n]+)`')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+CODE_COMMENT_RE = re.compile(r'(\s#|//|^#).*$')
+NON_LATIN_RE = re.compile(r'[^\x00-ɏ\s\d\W]')
+
+logging.basicConfig(level=logging.INFO)
+
+def _hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def text_shingles(text, size=SHINGLE_WORDS):
+    """Word n-gram shingles of lower-cased text."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def structure_shingles(text):
+    """
+    Language-independent features of a doc: link targets, inline code and
+    the lines of fenced code blocks. A translation keeps these while its
+    prose shares almost no words with the original.
+    """
+    features = set()
+    in_fence = False
+    for line in text.splitlines():
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            # Comments are often translated along with the prose
+            stripped = ' '.join(CODE_COMMENT_RE.sub('', line).split())
+            if stripped:
+                features.add('code:' + stripped)
+            continue
+        for match in URL_RE.finditer(line):
+            target = match.group(1) or match.group(2)
+            if not target.startswith('#'):
+                features.add('url:' + target)
+        for match in INLINE_CODE_RE.finditer(line):
+            features.add('inline:' + match.group(1).strip())
+    return features
+
+def minhash(shingles):
+    """
+    MinHash signature of a shingle set, NUM_PERM values long. Uses one
+    permutation hashing: each shingle is hashed once into one of NUM_PERM
+    bins and each bin keeps its minimum, so the cost is linear in the
+    number of shingles. Empty bins borrow from the next non-empty one.
+    """
+    empty = 1 << 64
+    signature = [empty] * NUM_PERM
+    for shingle in shingles:
+        h = _hash(shingle)
+        bin_index, value = h % NUM_PERM, h // NUM_PERM
+        if value < signature[bin_index]:
+            signature[bin_index] = value
+    filled = [i for i, value in enumerate(signature) if value != empty]
+    if not filled:
+        return tuple(signature)
+    for i in range(NUM_PERM):
+        if signature[i] == empty:
+            # Nearest filled bin to the right, tagged with the distance so borrowed values differ from real ones
+            j = next((f for f in filled if f > i), filled[0])
+            signature[i] = signature[j] + ((j - i) % NUM_PERM) * empty
+    return tuple(signature)
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+def looks_translated(rel_path, text):
+    """A translation by file name (README.ja.md, docs/zh/...) or by a mostly non-Latin script."""
+    if is_translation(PurePosixPath(rel_path)):
+        return True
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return False
+    return sum(1 for c in letters if NON_LATIN_RE.match(c)) / len(letters) > 0.3
+
+class LSHIndex:
+    """Banded LSH over MinHash signatures: only docs sharing a band are compared."""
+
+    def __init__(self, bands=LSH_BANDS):
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.buckets = defaultdict(list)
+
+    def _keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def candidates(self, signature):
+        seen = set()
+        for key in self._keys(signature):
+            for item in self.buckets.get(key, ()):
+                if item not in seen:
+                    seen.add(item)
+                    yield item
+
+    def add(self, item, signature):
+        for key in self._keys(signature):
+            self.buckets[key].append(item)
+
+def dedupe_docs(docs, threshold=DEDUPE_THRESHOLD, translation_threshold=TRANSLATION_THRESHOLD):
+    """
+    Drop near-duplicate docs from (rel_path, text) pairs. Docs are visited
+    in rank_docs() order, so the root README is kept over its copies. A doc
+    is dropped when its word-shingle MinHash is at least `threshold`
+    similar to a kept doc, or, for a translated doc, when its code/link
+    MinHash is at least `translation_threshold` similar. Returns (kept, dropped); dropped entries are dicts with
+    path, duplicate_of, similarity and kind ('duplicate' or 'translation').
+    """
+    texts = dict(docs)
+    text_index, structure_index = LSHIndex(), LSHIndex(STRUCTURE_LSH_BANDS)
+    signatures = {}
+    kept_paths = set()
+    dropped = []
+
+    for rel_path in rank_docs(texts):
+        text = texts[rel_path]
+        shingles = text_shingles(text)
+        structure = structure_shingles(text)
+        text_sig = minhash(shingles) if len(shingles) >= MIN_SHINGLES else None
+        structure_sig = minhash(structure) if len(structure) >= MIN_SHINGLES else None
+
+        match = None
+        if text_sig:
+            for other in text_index.candidates(text_sig):
+                score = similarity(text_sig, signatures[other][0])
+                if score >= threshold and (match is None or score > match[1]):
+                    match = (other, score, 'duplicate')
+        if match is None and structure_sig and looks_translated(rel_path, text):
+            for other in structure_index.candidates(structure_sig):
+                score = similarity(structure_sig, signatures[other][1])
+                if score >= translation_threshold and (match is None or score > match[1]):
+                    match = (other, score, 'translation')
+
+        if match:
+            other, score, kind = match
+            dropped.append({'path': rel_path, 'duplicate_of': other, 'similarity': round(score, 3), 'kind': kind})
+            continue
+
+        kept_paths.add(rel_path)
+        signatures[rel_path] = (text_sig, structure_sig)
+        if text_sig:
+            text_index.add(rel_path, text_sig)
+        if structure_sig:
+            structure_index.add(rel_path, structure_sig)
+
+    return [(rel_path, text) for rel_path, text in docs if rel_path in kept_paths], dropped
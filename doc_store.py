@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+
+OBJECTS_DIR_NAME = '.objects'
+MANIFEST_FILE_NAME = 'DOCS_MANIFEST.json'
+# "off" writes plain copies, "hardlink" stores each unique file once and hardlinks it into repo folders
+DOC_STORE = os.getenv('DOC_STORE', 'off')
+
+logging.basicConfig(level=logging.INFO)
+
+class DocStore:
+    """
+    Content-addressed blob store under <docs_dir>/.objects, keyed by SHA-256.
+    Identical files across repos are stored once and hardlinked into each
+    repo folder; every repo also gets a DOCS_MANIFEST.json mapping its
+    relative paths to blob digests, from which the tree can be rebuilt.
+    """
+
+    def __init__(self, docs_dir):
+        self.docs_dir = Path(docs_dir)
+        self.objects_dir = self.docs_dir / OBJECTS_DIR_NAME
+
+    def blob_path(self, digest):
+        return self.objects_dir / digest[:2] / digest[2:]
+
+    def put(self, data):
+        """Store bytes if not present yet and return their digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp_name, 0o444)
+            os.replace(tmp_name, path)
+        return digest
+
+    def link(self, digest, dest_file):
+        """
+        Point dest_file at a stored blob. The link is created next to the
+        destination and renamed over it, so an existing hardlink is replaced
+        rather than written through. Falls back to a copy across devices.
+        """
+        dest_file = Path(dest_file)
+        dest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = dest_file.with_name(f".{dest_file.name}.tmp")
+        if tmp_file.exists():
+            tmp_file.unlink()
+        try:
+            os.link(self.blob_path(digest), tmp_file)
+        except OSError:
+            shutil.copyfile(self.blob_path(digest), tmp_file)
+        os.replace(tmp_file, dest_file)
+
+    def write(self, data, dest_file):
+        digest = self.put(data)
+        self.link(digest, dest_file)
+        return digest
+
+    def save_manifest(self, repo_dir, entries):
+        """Write {relative path: digest} for a repo folder."""
+        with open(Path(repo_dir) / MANIFEST_FILE_NAME, 'w') as f:
+            json.dump(dict(sorted(entries.items())), indent=2, fp=f)
+
+    def load_manifest(self, repo_dir):
+        path = Path(repo_dir) / MANIFEST_FILE_NAME
+        if not path.exists():
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def repo_dirs(self):
+        return sorted(
+            p for p in self.docs_dir.iterdir()
+            if p.is_dir() and p.name != OBJECTS_DIR_NAME
+        )
+
+    def dedupe_repo(self, repo_dir, extensions):
+        """Move the doc files of an existing repo folder into the store."""
+        repo_dir = Path(repo_dir)
+        entries = {}
+        for file_path in sorted(repo_dir.rglob('*')):
+            if file_path.is_file() and file_path.suffix.lower() in extensions and file_path.name != 'SUMMARY.md':
+                entries[file_path.relative_to(repo_dir).as_posix()] = self.write(file_path.read_bytes(), file_path)
+        if entries:
+            self.save_manifest(repo_dir, entries)
+        return entries
+
+    def materialize(self, repo_dir):
+        """Recreate hardlinks from a repo's manifest, e.g. after a git checkout."""
+        entries = self.load_manifest(repo_dir)
+        for rel_path, digest in entries.items():
+            if self.blob_path(digest).exists():
+                self.link(digest, Path(repo_dir) / rel_path)
+        return len(entries)
+
+    def gc(self):
+        """Delete blobs no manifest refers to anymore (e.g. after unstarring). Returns bytes freed."""
+        referenced = set()
+        for repo_dir in self.repo_dirs():
+            referenced.update(self.load_manifest(repo_dir).values())
+        freed = 0
+        if not self.objects_dir.exists():
+            return freed
+        for path in self.objects_dir.glob('*/*'):
+            if path.parent.name + path.name not in referenced:
+                freed += path.stat().st_size
+                path.unlink()
+        return freed
+
+    def stats(self):
+        """Return logical vs. stored bytes over all repo manifests."""
+        logical_bytes = 0
+        files = 0
+        digests = set()
+        for repo_dir in self.repo_dirs():
+            for digest in self.load_manifest(repo_dir).values():
+                path = self.blob_path(digest)
+                if path.exists():
+                    logical_bytes += path.stat().st_size
+                    files += 1
+                    digests.add(digest)
+        stored_bytes = sum(self.blob_path(d).stat().st_size for d in digests)
+        return {
+            'files': files,
+            'unique_files': len(digests),
+            'logical_bytes': logical_bytes,
+            'stored_bytes': stored_bytes,
+            'bytes_saved': logical_bytes - stored_bytes,
+            'dedupe_ratio': logical_bytes / stored_bytes if stored_bytes else 1.0,
+        }
+
+def print_stats(store):
+    s = store.stats()
+    print(f"Files:         {s['files']} ({s['unique_files']} unique)")
+    print(f"Logical size:  {s['logical_bytes'] / 1024:.1f} KiB")
+    print(f"Stored size:   {s['stored_bytes'] / 1024:.1f} KiB")
+    print(f"Bytes saved:   {s['bytes_saved'] / 1024:.1f} KiB")
+    print(f"Dedupe ratio:  {s['dedupe_ratio']:.2f}x")
+
+if __name__ == "__main__":
+    from docs import DOCS_DIR, DOC_EXTENSIONS
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    store = DocStore(DOCS_DIR)
+    if command == 'dedupe':
+        for repo_dir in store.repo_dirs():
+            store.dedupe_repo(repo_dir, DOC_EXTENSIONS)
+        print_stats(store)
+    elif command == 'materialize':
+        for repo_dir in store.repo_dirs():
+            store.materialize(repo_dir)
+    elif command == 'gc':
+        print(f"Freed {store.gc() / 1024:.1f} KiB")
+    elif command == 'stats':
+        print_stats(store)
+    else:
+        print("Usage: python doc_store.py [stats|dedupe|materialize|gc]")
+        sys.exit(1)
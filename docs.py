@@ -1,49 +1,246 @@
 import os
+import time
 import shutil
 import logging
+import threading
+import itertools
 from pathlib import Path
 import subprocess
-from fetch import get_starred_repo_urls
+import tarfile
+import requests
+import urllib3
+from fnmatch import fnmatch
+from pathlib import PurePosixPath
+from concurrent.futures import ThreadPoolExecutor
+from fetch import sync_starred_repos
+from github_client import shared_client
+from mirror_cache import MirrorCache
+from doc_store import DocStore, DOC_STORE
+import metrics
 import stat
 logging.basicConfig(level=logging.INFO)
 
 DOCS_DIR = Path('./github_docs')
 CLONE_DIR = Path('./tmp_repos')
 
+SKIP_DIRS = {'.git', 'node_modules','.txt', 'venv', '__pycache__', '.github', 'tests', 'test', '.venv', 'dist', 'build'}
+DOC_EXTENSIONS = {'.md', '.rst', '.pdf', '.docx'}
+
+# Optional comma-separated globs matched against repo-relative paths
+DOCS_INCLUDE = [g for g in os.getenv('DOCS_INCLUDE', '').split(',') if g]
+DOCS_EXCLUDE = [g for g in os.getenv('DOCS_EXCLUDE', '').split(',') if g]
+MAX_DOC_FILE_SIZE = int(os.getenv('MAX_DOC_FILE_SIZE', str(10 * 1024 * 1024)))
+MAX_REPO_DOCS_SIZE = int(os.getenv('MAX_REPO_DOCS_SIZE', str(100 * 1024 * 1024)))
+
+CLONE_WORKERS = int(os.getenv('CLONE_WORKERS', '4'))
+CLONE_TIMEOUT = int(os.getenv('CLONE_TIMEOUT', '300'))
+# "sparse" fetches only doc blobs (partial clone + sparse checkout), "full" checks out
+# everything, "tarball" streams the repository archive without git at all, "mirror"
+# keeps shallow bare repos in MIRROR_CACHE_DIR and fetches them incrementally
+CLONE_STRATEGY = os.getenv('CLONE_STRATEGY', 'sparse')
+
+_mirror_cache = None
+_mirror_cache_lock = threading.Lock()
+
+_worker_state = threading.local()
+_worker_ids = itertools.count(1)
+
 def handle_remove_readonly(func, path, exc):
     """Error handler for Windows readonly files"""
     os.chmod(path, stat.S_IWRITE)
     func(path)
 
-def clone_repo(repo_url, clone_path):
+def clone_repo(repo_url, clone_path, timeout=CLONE_TIMEOUT, strategy=None):
     """Clone a repository"""
+    strategy = strategy or CLONE_STRATEGY
+    if strategy == 'sparse':
+        return sparse_clone_repo(repo_url, clone_path, timeout)
+
     try:
         subprocess.run(
             ['git', 'clone', '--depth', '1', repo_url, str(clone_path)],
             check=True,
             capture_output=True,
-            text=True
+            text=True,
+            timeout=timeout
         )
+        record_clone_size(repo_url, clone_path, strategy)
         return True
     except subprocess.CalledProcessError as e:
         logging.error(f"Failed to clone {repo_url}: {e}")
         return False
-    
-def find_docs(repo_path):
-    docs_files = []
-    repo_path = Path(repo_path)
+    except subprocess.TimeoutExpired:
+        logging.error(f"Timed out cloning {repo_url} after {timeout}s")
+        return False
+
+def case_insensitive_glob(extension):
+    """'.md' -> '*.[mM][dD]', since sparse-checkout patterns are case-sensitive."""
+    return '*.' + ''.join(f'[{c.lower()}{c.upper()}]' if c.isalpha() else c for c in extension.lstrip('.'))
+
+def sparse_checkout_patterns():
+    """Non-cone sparse-checkout patterns matching what find_docs keeps."""
+    patterns = [case_insensitive_glob(ext) for ext in sorted(DOC_EXTENSIONS)]
+    patterns += [f'!**/{skip_dir}/**' for skip_dir in sorted(SKIP_DIRS)]
+    return patterns
+
+def sparse_clone_repo(repo_url, clone_path, timeout=CLONE_TIMEOUT):
+    """
+    Shallow partial clone that downloads commits and trees but only the
+    blobs of documentation files. Falls back to a full shallow clone if
+    any step fails; a server without filter support still works, it just
+    sends every blob.
+    """
+    git = ['git', '-C', str(clone_path)]
+    try:
+        clone = subprocess.run(
+            ['git', 'clone', '--depth', '1', '--filter=blob:none', '--sparse', '--no-checkout',
+             repo_url, str(clone_path)],
+            check=True, capture_output=True, text=True, timeout=timeout
+        )
+        if 'filtering not recognized by server' in clone.stderr:
+            logging.warning(f"Server ignored --filter for {repo_url}, all blobs were transferred")
+        subprocess.run(
+            git + ['sparse-checkout', 'set', '--no-cone', *sparse_checkout_patterns()],
+            check=True, capture_output=True, text=True, timeout=timeout
+        )
+        subprocess.run(
+            git + ['checkout'],
+            check=True, capture_output=True, text=True, timeout=timeout
+        )
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        logging.warning(f"Sparse clone failed for {repo_url} ({e}), falling back to full clone")
+        if Path(clone_path).exists():
+            shutil.rmtree(clone_path, onerror=handle_remove_readonly)
+        return clone_repo(repo_url, clone_path, timeout, strategy='full')
+
+    record_clone_size(repo_url, clone_path, 'sparse')
+    return True
+
+def record_clone_size(repo_url, clone_path, strategy):
+    """Log and count the size of the object store, i.e. what was transferred."""
+    objects_dir = Path(clone_path) / '.git' / 'objects'
+    size = sum(f.stat().st_size for f in objects_dir.rglob('*') if f.is_file())
+    metrics.incr(f"clone bytes {strategy}", size)
+    logging.info(f"Cloned {repo_url} ({strategy}): {size / 1024:.1f} KiB transferred")
+    return size
+
+def worker_clone_dir():
+    """
+    Return this thread's private directory under CLONE_DIR, so concurrent
+    workers never touch each other's clones.
+    """
+    if not hasattr(_worker_state, 'clone_dir'):
+        _worker_state.clone_dir = CLONE_DIR / f"worker-{next(_worker_ids)}"
+    _worker_state.clone_dir.mkdir(parents=True, exist_ok=True)
+    return _worker_state.clone_dir
 
-    skip_dirs = {'.git', 'node_modules','.txt', 'venv', '__pycache__', '.github', 'tests', 'test', '.venv', 'dist', 'build'}
+def run_pool(func, items, workers=CLONE_WORKERS, label="repos"):
+    """
+    Call func(item) for every item on a pool of `workers` threads and return
+    the results in input order. Exceptions are logged and count as False.
+    Logs throughput in items per minute once everything has finished.
+    """
+    def run(indexed):
+        i, item = indexed
+        logging.info(f"[{i}/{len(items)}] {item}")
+        try:
+            return func(item)
+        except Exception as e:
+            logging.error(f"Failed to process {item}: {e}")
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, enumerate(items, 1)))
+    elapsed = time.perf_counter() - start
 
-    doc_extensions = {'.md', '.rst', '.pdf', '.docx'}
+    rate = len(items) / elapsed * 60 if elapsed > 0 else 0.0
+    metrics.record(f"pool {label}", elapsed)
+    logging.info(f"Processed {len(items)} {label} in {elapsed:.1f}s with {workers} workers ({rate:.1f} {label}/min)")
+    return results
+
+class DocFile(Path):
+    """A Path returned by find_docs that carries the stat data read during the walk."""
+    size = None
+    mtime_ns = None
+
+def matches_globs(rel_path, include=None, exclude=None):
+    """Apply the include/exclude globs (DOCS_INCLUDE/DOCS_EXCLUDE by default) to a relative path."""
+    include = DOCS_INCLUDE if include is None else include
+    exclude = DOCS_EXCLUDE if exclude is None else exclude
+    rel_path = str(rel_path)
+    if include and not any(fnmatch(rel_path, pattern) for pattern in include):
+        return False
+    return not any(fnmatch(rel_path, pattern) for pattern in exclude)
 
-    for file_path in repo_path.rglob('*'):
-        if any(skip_dir in file_path.parts for skip_dir in skip_dirs):
+def is_doc_path(rel_path):
+    """True if a path relative to the repo root is a doc file find_docs would keep."""
+    rel_path = PurePosixPath(rel_path)
+    if any(part in SKIP_DIRS for part in rel_path.parts[:-1]):
+        return False
+    return rel_path.suffix.lower() in DOC_EXTENSIONS and matches_globs(rel_path)
+
+def walk_docs(repo_path, max_file_size=None, max_repo_size=None):
+    """
+    Yield a DocFile for every doc under repo_path using os.scandir.
+    Directories in SKIP_DIRS are never entered, entries are filtered on
+    name before anything is stat'ed, and oversized files are skipped.
+    Stops once max_repo_size bytes of docs have been collected.
+    """
+    max_file_size = MAX_DOC_FILE_SIZE if max_file_size is None else max_file_size
+    max_repo_size = MAX_REPO_DOCS_SIZE if max_repo_size is None else max_repo_size
+    repo_path = Path(repo_path)
+    total_size = 0
+    stack = [(str(repo_path), '')]
+
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            logging.warning(f"Cannot read {dir_path}: {e}")
             continue
 
-        if file_path.is_file() and file_path.suffix.lower() in doc_extensions:
-            docs_files.append(file_path)
-    return docs_files
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in SKIP_DIRS:
+                    subdirs.append((entry.path, rel_path + '/'))
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in DOC_EXTENSIONS:
+                continue
+            if not matches_globs(rel_path) or not entry.is_file():
+                continue
+
+            st = entry.stat()
+            if max_file_size and st.st_size > max_file_size:
+                logging.warning(f"Skipping {rel_path}: {st.st_size} bytes exceeds the per-file limit")
+                continue
+            if max_repo_size and total_size + st.st_size > max_repo_size:
+                logging.warning(f"Docs size limit of {max_repo_size} bytes reached in {repo_path.name}, stopping")
+                return
+            total_size += st.st_size
+
+            doc_file = DocFile(entry.path)
+            doc_file.size = st.st_size
+            doc_file.mtime_ns = st.st_mtime_ns
+            yield doc_file
+
+        # Reversed so the stack pops directories in name order
+        stack.extend(reversed(subdirs))
+
+def find_docs(repo_path):
+    return list(walk_docs(repo_path))
+
+def list_repo_docs(dest_dir):
+    """List the copied doc files of a repo, leaving out SUMMARY.md and metadata files."""
+    dest_dir = Path(dest_dir)
+    return [
+        f for f in dest_dir.rglob('*')
+        if f.is_file() and f.suffix.lower() in DOC_EXTENSIONS and f.name != 'SUMMARY.md'
+    ]
 
 def copy_docs(docs_files, repo_name, destination, repo_path):
     dest_dir = Path(destination) / repo_name
@@ -56,47 +253,209 @@ def copy_docs(docs_files, repo_name, destination, repo_path):
             dest_file = dest_dir / rel_path
 
             dest_file.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(file_path, dest_file)
+            if dest_file.exists():
+                dest_file.unlink()
+            if getattr(file_path, 'mtime_ns', None) is not None:
+                # Stat data is already known from the walk, skip copy2's extra stats
+                with open(file_path, 'rb') as src, open(dest_file, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.utime(dest_file, ns=(file_path.mtime_ns, file_path.mtime_ns))
+            else:
+                shutil.copy2(file_path, dest_file)
             logging.info(f"Copied: {file_path.name}")
         except Exception as e:
             logging.error(f"Failed to copy {file_path.name}: {e}")
 
-def process_repo(repo_url):
-    """Clone repo, extract docs, and copy them."""
+def extract_tarball_docs(repo_url, dest_dir):
+    """
+    Stream the repository tarball from the API and write only the members
+    that pass is_doc_path() straight into dest_dir. Nothing is cloned or
+    staged on disk. Returns the number of files written, or None on failure.
+    """
     parts = repo_url.rstrip('/').split('/')
-    owner = parts[-2]
-    repo_name = parts[-1]
-    full_repo_name = f"{owner}_{repo_name}"
+    owner, repo_name = parts[-2], parts[-1]
+    dest_dir = Path(dest_dir)
+    written = 0
+    bytes_read = 0
 
-    logging.info(f"Processing repository: {owner}/{repo_name}")
+    try:
+        with shared_client().get(f'/repos/{owner}/{repo_name}/tarball', stream=True,
+                                 timeout=CLONE_TIMEOUT) as response:
+            if response.status_code != 200:
+                logging.error(f"Failed to download tarball for {owner}/{repo_name}: {response.status_code}")
+                return None
+            response.raw.decode_content = True
+            with tarfile.open(fileobj=response.raw, mode='r|*') as archive:
+                for member in archive:
+                    # Members are prefixed with "<owner>-<repo>-<sha>/"
+                    rel_path = PurePosixPath(*PurePosixPath(member.name).parts[1:])
+                    if not member.isfile() or not rel_path.parts or not is_doc_path(rel_path):
+                        continue
+                    if MAX_DOC_FILE_SIZE and member.size > MAX_DOC_FILE_SIZE:
+                        logging.warning(f"Skipping {rel_path}: {member.size} bytes exceeds the per-file limit")
+                        continue
+                    if MAX_REPO_DOCS_SIZE and bytes_read + member.size > MAX_REPO_DOCS_SIZE:
+                        logging.warning(f"Docs size limit reached for {owner}/{repo_name}, stopping")
+                        break
+                    if rel_path.is_absolute() or '..' in rel_path.parts:
+                        logging.warning(f"Skipping unsafe tarball member {member.name}")
+                        continue
+
+                    with archive.extractfile(member) as src:
+                        write_doc_bytes(dest_dir / rel_path, src.read())
+                    written += 1
+                    bytes_read += member.size
+                    logging.info(f"Extracted: {rel_path.name}")
+    except (tarfile.TarError, OSError, urllib3.exceptions.HTTPError, requests.RequestException) as e:
+        # urllib3 errors from reading response.raw mid-stream are not OSErrors
+        logging.error(f"Failed to extract tarball for {owner}/{repo_name}: {e}")
+        return None
+
+    metrics.incr("tarball doc bytes", bytes_read)
+    return written
+
+def mirror_cache():
+    """Return the process-wide MirrorCache, creating it on first use."""
+    global _mirror_cache
+    with _mirror_cache_lock:
+        if _mirror_cache is None:
+            _mirror_cache = MirrorCache()
+        return _mirror_cache
+
+def extract_mirror_docs(repo_url, full_repo_name, dest_dir):
+    """
+    Refresh the cached bare mirror of a repository and write its doc blobs
+    into dest_dir. Returns the number of files written, or None on failure.
+    """
+    cache = mirror_cache()
+    mirror_path = cache.update(repo_url, full_repo_name)
+    if mirror_path is None:
+        return None
 
+    dest_dir = Path(dest_dir)
+    written = 0
+    total_size = 0
+    try:
+        for rel_path, data in cache.read_blobs(mirror_path, is_doc_path, MAX_DOC_FILE_SIZE):
+            if MAX_REPO_DOCS_SIZE and total_size + len(data) > MAX_REPO_DOCS_SIZE:
+                logging.warning(f"Docs size limit reached for {full_repo_name}, stopping")
+                break
+            if '..' in PurePosixPath(rel_path).parts:
+                continue
+            dest_file = dest_dir / rel_path
+            write_doc_bytes(dest_file, data)
+            written += 1
+            total_size += len(data)
+            logging.info(f"Extracted: {dest_file.name}")
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        logging.error(f"Failed to read docs from mirror of {full_repo_name}: {e}")
+        return None
+    finally:
+        cache.release(full_repo_name)
+    return written
+
+def fetch_repo_docs(repo_url, full_repo_name):
+    """
+    Put the docs of one repository into DOCS_DIR/<full_repo_name>, either by
+    cloning and copying or by streaming the tarball. Returns (ok, found) where
+    found is the number of doc files written.
+    """
     dest_dir = DOCS_DIR / full_repo_name
-    if dest_dir.exists() and any(dest_dir.iterdir()):
-        logging.info(f"Documentation already exists for {owner}/{repo_name}, skipping.")
-        return True
 
-    clone_path = CLONE_DIR / full_repo_name
+    if CLONE_STRATEGY in ('tarball', 'mirror'):
+        # Extract into a staging folder so a failure halfway never leaves a
+        # partial doc tree that the next run would take as complete
+        staging_dir = worker_clone_dir() / f"{full_repo_name}.docs"
+        if staging_dir.exists():
+            shutil.rmtree(staging_dir, onerror=handle_remove_readonly)
+        try:
+            if CLONE_STRATEGY == 'tarball':
+                written = extract_tarball_docs(repo_url, staging_dir)
+            else:
+                written = extract_mirror_docs(repo_url, full_repo_name, staging_dir)
+            if written is None:
+                return False, 0
+            move_docs(staging_dir, dest_dir)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        if not written:
+            logging.warning(f"No documentation found for {full_repo_name}")
+        store_repo_docs(dest_dir)
+        return True, written
+
+    clone_path = worker_clone_dir() / full_repo_name
     if clone_path.exists():
         shutil.rmtree(clone_path, onerror=handle_remove_readonly)
 
     if not clone_repo(repo_url, clone_path):
-        return False
-    
-    docs_files = find_docs(clone_path)
+        return False, 0
 
-    if not docs_files:
-        logging.warning(f"No documentation found for {repo_name}")
-    else:
+    docs_files = find_docs(clone_path)
+    if docs_files:
         logging.info(f"Found {len(docs_files)} documentation files")
-
         copy_docs(docs_files, full_repo_name, DOCS_DIR, clone_path)
+    else:
+        logging.warning(f"No documentation found for {full_repo_name}")
+
     try:
         shutil.rmtree(clone_path, onerror=handle_remove_readonly)
-        logging.info(f"Cleaned up temporary files for {repo_name}")
+        logging.info(f"Cleaned up temporary files for {full_repo_name}")
     except Exception as e:
         logging.error(f"Failed to cleanup {clone_path}: {e}")
-    
-    return True
+
+    store_repo_docs(dest_dir)
+    return True, len(docs_files)
+
+def move_docs(src_dir, dest_dir):
+    """Move every file under src_dir to the same relative path under dest_dir."""
+    src_dir, dest_dir = Path(src_dir), Path(dest_dir)
+    if not src_dir.exists():
+        return
+    for src_file in sorted(p for p in src_dir.rglob('*') if p.is_file()):
+        dest_file = dest_dir / src_file.relative_to(src_dir)
+        dest_file.parent.mkdir(parents=True, exist_ok=True)
+        # Renaming over an existing hardlink replaces it rather than writing through
+        shutil.move(str(src_file), str(dest_file))
+
+def store_repo_docs(dest_dir):
+    """With DOC_STORE=hardlink, move a repo's docs into the shared blob store."""
+    if DOC_STORE != 'hardlink' or not Path(dest_dir).exists():
+        return
+    entries = DocStore(DOCS_DIR).dedupe_repo(dest_dir, DOC_EXTENSIONS)
+    logging.info(f"Stored {len(entries)} docs for {Path(dest_dir).name} in the content-addressed store")
+
+def write_doc_bytes(dest_file, data):
+    """Write a doc file, replacing (not writing through) any existing hardlink."""
+    dest_file = Path(dest_file)
+    dest_file.parent.mkdir(parents=True, exist_ok=True)
+    if dest_file.exists():
+        dest_file.unlink()
+    dest_file.write_bytes(data)
+
+def prune_unstarred(removed, destination=DOCS_DIR):
+    """Delete the docs folders of repositories that are no longer starred."""
+    for entry in removed:
+        dest_dir = Path(destination) / entry['repo'].replace('/', '_')
+        if dest_dir.exists():
+            shutil.rmtree(dest_dir, onerror=handle_remove_readonly)
+            logging.info(f"Pruned docs for unstarred repository {entry['repo']}")
+
+def process_repo(repo_url):
+    """Clone repo, extract docs, and copy them."""
+    parts = repo_url.rstrip('/').split('/')
+    owner = parts[-2]
+    repo_name = parts[-1]
+    full_repo_name = f"{owner}_{repo_name}"
+
+    logging.info(f"Processing repository: {owner}/{repo_name}")
+
+    dest_dir = DOCS_DIR / full_repo_name
+    if dest_dir.exists() and any(dest_dir.iterdir()):
+        logging.info(f"Documentation already exists for {owner}/{repo_name}, skipping.")
+        return True
+
+    ok, _ = fetch_repo_docs(repo_url, full_repo_name)
+    return ok
 
 def fetch_all_starred_docs():
     """Fetch documentation from all starred repositories."""
@@ -104,15 +463,13 @@ def fetch_all_starred_docs():
     CLONE_DIR.mkdir(parents=True, exist_ok=True)
 
     logging.info("Fetching starred repositories...")
-    starred_repos = get_starred_repo_urls()
+    starred, removed = sync_starred_repos()
+    prune_unstarred(removed)
+    starred_repos = [entry['html_url'] for entry in starred]
     logging.info(f"Found {len(starred_repos)} starred repositories.\n")
 
-
-    success_count = 0
-    for i, repo_url in enumerate(starred_repos, 1):
-        logging.info(f"[{i}/{len(starred_repos)}] {repo_url}")
-        if process_repo(repo_url):
-            success_count += 1
+    results = run_pool(process_repo, starred_repos)
+    success_count = sum(1 for ok in results if ok)
 
     if CLONE_DIR.exists():
         shutil.rmtree(CLONE_DIR, onerror=handle_remove_readonly)
@@ -0,0 +1,130 @@
+import os
+import hashlib
+import logging
+import zipfile
+import multiprocessing
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+EXTRACT_CACHE_DIR = Path(os.getenv('EXTRACT_CACHE_DIR', './.cache/extracted'))
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', str(os.cpu_count() or 2)))
+# Bump when an extractor changes so cached text is regenerated
+EXTRACTOR_VERSION = '1'
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+logging.basicConfig(level=logging.INFO)
+
+def extract_pdf_text(path):
+    if PdfReader is None:
+        raise RuntimeError("pypdf is not installed")
+    reader = PdfReader(path)
+    pages = [page.extract_text() or '' for page in reader.pages]
+    return '\n\n'.join(page.strip() for page in pages if page.strip())
+
+def extract_docx_text(path):
+    """Read paragraph text from word/document.xml with the standard library."""
+    with zipfile.ZipFile(path) as archive:
+        root = ET.fromstring(archive.read('word/document.xml'))
+    paragraphs = []
+    for paragraph in root.iter(f'{WORD_NS}p'):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f'{WORD_NS}t' and node.text:
+                parts.append(node.text)
+            elif node.tag == f'{WORD_NS}tab':
+                parts.append('\t')
+            elif node.tag in (f'{WORD_NS}br', f'{WORD_NS}cr'):
+                parts.append('\n')
+        paragraphs.append(''.join(parts))
+    return '\n'.join(paragraphs).strip()
+
+# Suffix -> function(path) returning plain text; register more with register_extractor
+EXTRACTORS = {
+    '.pdf': extract_pdf_text,
+    '.docx': extract_docx_text,
+}
+
+def register_extractor(suffix, func):
+    """Add or replace the extractor for a file suffix (must be a top-level, picklable function)."""
+    EXTRACTORS[suffix.lower()] = func
+
+def needs_extraction(path):
+    return Path(path).suffix.lower() in EXTRACTORS
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _cache_path(digest):
+    return EXTRACT_CACHE_DIR / f"{digest}-v{EXTRACTOR_VERSION}.txt"
+
+def _run_extractor(job):
+    """Worker entry point: job is (extractor, path); returns (text, error)."""
+    extractor, path = job
+    try:
+        return extractor(path), None
+    except Exception as e:
+        return None, str(e)
+
+def pool_context():
+    """
+    Start extractor processes without fork: extract_texts runs on worker
+    threads, and forking a process with live threads and held locks (logging,
+    HTTP pools) can deadlock the child.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def extract_texts(paths, workers=EXTRACT_WORKERS):
+    """
+    Return {path: text} for every path with a registered extractor. Text is
+    cached on disk by file hash; cache misses are extracted in a process
+    pool. Files that fail to extract map to None and must not be sent on.
+    """
+    results = {}
+    pending = {}
+    for path in paths:
+        if not needs_extraction(path):
+            continue
+        try:
+            digest = file_digest(path)
+        except OSError as e:
+            logging.error(f"Failed to read {Path(path).name}: {e}")
+            results[path] = None
+            continue
+        cache_file = _cache_path(digest)
+        if cache_file.exists():
+            results[path] = cache_file.read_text(encoding='utf-8')
+        else:
+            pending[path] = digest
+
+    if pending:
+        EXTRACT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        paths_to_run = list(pending)
+        jobs = [(EXTRACTORS[Path(path).suffix.lower()], str(path)) for path in paths_to_run]
+        if len(jobs) > 1 and workers > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=pool_context()) as executor:
+                outputs = list(executor.map(_run_extractor, jobs))
+        else:
+            outputs = [_run_extractor(job) for job in jobs]
+
+        for path, (text, error) in zip(paths_to_run, outputs):
+            if error is not None:
+                logging.warning(f"Could not extract text from {Path(path).name}: {error}")
+                results[path] = None
+                continue
+            _cache_path(pending[path]).write_text(text, encoding='utf-8')
+            results[path] = text
+            logging.info(f"Extracted {len(text)} chars from {Path(path).name}")
+
+    return results
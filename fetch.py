@@ -1,47 +1,176 @@
 import os
-import requests
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from github_client import GitHubClient
+from http_cache import ETagCache
 
 load_dotenv()
 
-GITHUB_TOKEN = os.getenv('GIT_TOKEN')
+PER_PAGE = 100
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', '8'))
+USE_HTTP_CACHE = os.getenv('HTTP_CACHE', '1') != '0'
+STAR_MANIFEST_FILE = Path(os.getenv('STAR_MANIFEST_FILE', './star_manifest.json'))
+STAR_ACCEPT = 'application/vnd.github.star+json'
 
+logging.basicConfig(level=logging.INFO)
 
-headers = {
-    'Accept': 'application/vnd.github+json',
-    'X-GitHub-Api-Version': '2022-11-28',
-    'Authorization': f'Bearer {GITHUB_TOKEN}'
-}
+LAST_PAGE_RE = re.compile(r'<[^>]*[?&]page=(\d+)[^>]*>;\s*rel="last"')
 
-logging.basicConfig(level=logging.INFO)
-def get_starred_repo_urls():
-    page = 1
-    repo_urls = []
+def parse_last_page(link_header):
+    """Return the page number of the rel="last" link, or None if there is none."""
+    if not link_header:
+        return None
+    match = LAST_PAGE_RE.search(link_header)
+    return int(match.group(1)) if match else None
+
+def fetch_starred_page(gh, page, cache=None, per_page=PER_PAGE, accept=None):
+    """
+    Fetch one page of starred repositories and return (repos, link_header).
+    With a cache, the request is made conditional on the stored ETag and a
+    304 answer is served from disk. Raises on any other non-200 response.
+    """
+    url = gh.url(f'/user/starred?page={page}&per_page={per_page}')
+    accept = accept or gh.session.headers['Accept']
+    cache_key = f"{accept} {url}"
+    cached = cache.get(cache_key) if cache else None
+    request_headers = {'Accept': accept}
+    if cached:
+        request_headers['If-None-Match'] = cached['etag']
+
+    response = gh.get(url, headers=request_headers)
+
+    if response.status_code == 304 and cached:
+        cache.record_hit(cached)
+        return json.loads(cached['body']), cached.get('link')
+
+    if response.status_code != 200:
+        raise RuntimeError(f"Error: {response.status_code} - {response.text}")
+
+    link = response.headers.get('Link')
+    if cache:
+        cache.record_miss(response.text)
+        cache.put(cache_key, response.headers.get('ETag'), response.text, link)
+    return response.json(), link
+
+def fetch_all_starred(gh, cache=None, max_workers=FETCH_WORKERS, accept=None):
+    """
+    Return every raw starred item, in star order.
+    Page 1 is fetched first to learn the page count from the Link header,
+    the remaining pages are then fetched concurrently over one session.
+    """
+    items = []
+    first_items, link = fetch_starred_page(gh, 1, cache, accept=accept)
+    items.extend(first_items)
+    last_page = parse_last_page(link) or 1
+    logging.info(f"Fetched page 1/{last_page}, total repos: {len(items)}")
+
+    if last_page > 1:
+        pages = range(2, last_page + 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map() yields in submission order, which keeps star order
+            results = executor.map(lambda page: fetch_starred_page(gh, page, cache, accept=accept), pages)
+            for page, (page_items, _) in zip(pages, results):
+                items.extend(page_items)
+                logging.info(f"Fetched page {page}/{last_page}, total repos: {len(items)}")
+    return items
+
+def get_starred_repo_urls(max_workers=FETCH_WORKERS, use_cache=USE_HTTP_CACHE):
+    """Return the html_url of every starred repository, in star order."""
+    cache = ETagCache() if use_cache else None
+    with GitHubClient(pool_size=max_workers) as gh:
+        items = fetch_all_starred(gh, cache, max_workers)
+
+    if cache:
+        cache.report()
+    return [repo['html_url'] for repo in items]
+
+def star_entry(item):
+    """Convert a star+json item into a manifest entry."""
+    repo = item['repo']
+    return {
+        'repo': repo['full_name'],
+        'html_url': repo['html_url'],
+        'starred_at': item['starred_at'],
+        'pushed_at': repo.get('pushed_at'),
+        'default_branch': repo.get('default_branch'),
+    }
+
+def load_star_manifest():
+    if STAR_MANIFEST_FILE.exists():
+        with open(STAR_MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+    return {"stars": []}
+
+def save_star_manifest(manifest):
+    tmp_file = STAR_MANIFEST_FILE.with_suffix('.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, indent=2, fp=f)
+    os.replace(tmp_file, STAR_MANIFEST_FILE)
+
+def count_starred(gh, cache=None):
+    """Return the total number of stars using a single per_page=1 request."""
+    items, link = fetch_starred_page(gh, 1, cache, per_page=1)
+    return parse_last_page(link) or len(items)
+
+def sync_starred_repos(max_workers=FETCH_WORKERS, use_cache=USE_HTTP_CACHE, full=False):
+    """
+    Bring the star manifest up to date and return (stars, removed).
+
+    Stars are listed newest first, so paging stops at the first star that
+    is not newer than the newest one already in the manifest. One extra
+    per_page=1 request gives the total star count; if it does not match
+    known + new stars, something was unstarred and a full listing is done
+    to find out what. `removed` lists the manifest entries no longer starred.
+    """
+    manifest = load_star_manifest()
+    known = manifest.get("stars", [])
+    cache = ETagCache() if use_cache else None
 
-    while True:
-        response = requests.get(
-            f'https://api.github.com/user/starred?page={page}&per_page=100',
-            headers=headers
-        )
+    with GitHubClient(pool_size=max_workers) as gh:
+        if full or not known:
+            logging.info("Running full star sync...")
+            stars = [star_entry(item) for item in fetch_all_starred(gh, cache, max_workers, STAR_ACCEPT)]
+        else:
+            cutoff = max(entry['starred_at'] for entry in known)
+            new_stars = []
+            page = 1
+            while True:
+                items, link = fetch_starred_page(gh, page, cache, accept=STAR_ACCEPT)
+                fresh = [star_entry(item) for item in items if item['starred_at'] > cutoff]
+                new_stars.extend(fresh)
+                if len(fresh) < len(items) or parse_last_page(link) is None:
+                    break
+                page += 1
+            logging.info(f"Found {len(new_stars)} new stars in {page} page(s)")
 
-        if response.status_code != 200:
-            logging.error(f"Error: {response.status_code} - {response.text}")
-            break
+            new_names = {entry['repo'] for entry in new_stars}
+            stars = new_stars + [entry for entry in known if entry['repo'] not in new_names]
 
-        repos = response.json()
+            total = count_starred(gh, cache)
+            if total != len(stars):
+                logging.info(f"GitHub reports {total} stars but {len(stars)} are known, running full sync...")
+                stars = [star_entry(item) for item in fetch_all_starred(gh, cache, max_workers, STAR_ACCEPT)]
+        gh.report()
 
-        if not repos:
-            break
+    starred_names = {entry['repo'] for entry in stars}
+    removed = [entry for entry in known if entry['repo'] not in starred_names]
+    if removed:
+        logging.info(f"Unstarred since last sync: {[entry['repo'] for entry in removed]}")
 
-        for repo in repos:
-            repo_urls.append(repo['html_url'])
+    manifest["stars"] = stars
+    manifest["synced_at"] = datetime.now(timezone.utc).isoformat()
+    save_star_manifest(manifest)
 
-        page += 1
-        logging.info(f"Fetched page {page - 1}, total repos: {len(repo_urls)}")
-    return repo_urls
+    if cache:
+        cache.report()
+    return stars, removed
 
 if __name__ == "__main__":
     starred_repos = get_starred_repo_urls()
     for url in starred_repos:
-        print(url)
\ No newline at end of file
+        print(url)
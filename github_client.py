@@ -0,0 +1,183 @@
+import os
+import re
+import time
+import logging
+import threading
+import requests
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+GITHUB_TOKEN = os.getenv('GIT_TOKEN')
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+GITHUB_POOL_SIZE = int(os.getenv('GITHUB_POOL_SIZE', '8'))
+GITHUB_TIMEOUT = float(os.getenv('GITHUB_TIMEOUT', '30'))
+GITHUB_MAX_RETRIES = int(os.getenv('GITHUB_MAX_RETRIES', '5'))
+# Below this many remaining requests, calls are spread evenly until the reset
+PACE_BELOW = int(os.getenv('GITHUB_PACE_BELOW', '100'))
+SECONDARY_LIMIT_WAIT = 60
+
+headers = {
+    'Accept': 'application/vnd.github+json',
+    'X-GitHub-Api-Version': '2022-11-28',
+    'Authorization': f'Bearer {GITHUB_TOKEN}'
+}
+
+logging.basicConfig(level=logging.INFO)
+
+ENDPOINT_PATTERNS = [
+    (re.compile(r'^/repos/[^/]+/[^/]+'), '/repos/{owner}/{repo}'),
+]
+
+def endpoint_name(url):
+    """Reduce a request URL to a low-cardinality endpoint label for metrics."""
+    path = re.sub(r'^https?://[^/]+', '', url).split('?', 1)[0]
+    for pattern, replacement in ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return path
+
+class GitHubClient:
+    """
+    Pooled, rate-limit-aware HTTP client for the GitHub REST and GraphQL APIs.
+
+    One keep-alive session is shared by every caller. The primary rate limit
+    is tracked per resource from the X-RateLimit-* headers and, once the
+    remaining budget drops below PACE_BELOW, requests are spaced evenly until
+    the reset. Rate-limited (403/429) and 5xx responses are retried, honoring
+    Retry-After for secondary limits. Latencies and retries are recorded in
+    `metrics` under "github <endpoint>".
+    """
+
+    def __init__(self, api_url=None, pool_size=GITHUB_POOL_SIZE,
+                 timeout=GITHUB_TIMEOUT, max_retries=GITHUB_MAX_RETRIES):
+        self.api_url = (api_url or GITHUB_API_URL).rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(headers)
+        self._lock = threading.Lock()
+        self._limits = {}
+        self._next_slot = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def url(self, path):
+        return path if path.startswith('http') else f'{self.api_url}{path}'
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def request(self, method, path, **kwargs):
+        """
+        Send a request and return the response. Retries are exhausted
+        before giving up, after which the last response is returned as is
+        (or the last connection error is raised).
+        """
+        url = self.url(path)
+        endpoint = endpoint_name(url)
+        resource = 'graphql' if endpoint == '/graphql' else 'core'
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            self._pace(resource)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.record(f"github {endpoint}", time.perf_counter() - start)
+                if attempt == self.max_retries:
+                    raise
+                wait = 2 ** attempt
+                logging.warning(f"{method} {endpoint} failed ({e}), retrying in {wait}s...")
+                metrics.incr(f"github {endpoint} retries")
+                time.sleep(wait)
+                continue
+
+            metrics.record(f"github {endpoint}", time.perf_counter() - start)
+            self._update_limits(response, resource)
+
+            wait = self._retry_wait(response, attempt)
+            if wait is None or attempt == self.max_retries:
+                return response
+            logging.warning(f"{method} {endpoint} returned {response.status_code}, retrying in {wait:.0f}s...")
+            metrics.incr(f"github {endpoint} retries")
+            time.sleep(wait)
+
+    def _update_limits(self, response, default_resource):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        resource = response.headers.get('X-RateLimit-Resource', default_resource)
+        with self._lock:
+            self._limits[resource] = (int(remaining), float(reset))
+
+    def _pace(self, resource):
+        """Sleep if needed so the remaining budget lasts until the reset."""
+        with self._lock:
+            limit = self._limits.get(resource)
+            if not limit:
+                return
+            remaining, reset = limit
+            now = time.time()
+            if remaining >= PACE_BELOW or now >= reset:
+                return
+            if remaining <= 0:
+                wait = reset - now + 1
+                self._limits[resource] = (0, reset)
+            else:
+                interval = (reset - now) / remaining
+                slot = max(now, self._next_slot.get(resource, now))
+                self._next_slot[resource] = slot + interval
+                self._limits[resource] = (remaining - 1, reset)
+                wait = slot - now
+        if wait > 0:
+            logging.info(f"GitHub {resource} budget low ({remaining} left), waiting {wait:.1f}s")
+            time.sleep(wait)
+
+    def _retry_wait(self, response, attempt):
+        """Return how long to wait before retrying `response`, or None."""
+        status = response.status_code
+        if status >= 500:
+            return 2 ** attempt
+        if status not in (403, 429):
+            return None
+
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            return float(retry_after)
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            reset = float(response.headers.get('X-RateLimit-Reset', time.time()))
+            return max(reset - time.time(), 0) + 1
+        if status == 429 or 'secondary rate limit' in response.text.lower():
+            return SECONDARY_LIMIT_WAIT * 2 ** attempt
+        # A plain 403 (missing scope, blocked repo) won't succeed on retry
+        return None
+
+    def report(self):
+        metrics.report("github ")
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+def shared_client():
+    """Return the process-wide GitHubClient, creating it on first use."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = GitHubClient()
+        return _shared_client
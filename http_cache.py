@@ -0,0 +1,66 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+HTTP_CACHE_DIR = Path(os.getenv('HTTP_CACHE_DIR', './.cache/http'))
+
+class ETagCache:
+    """
+    On-disk cache of GitHub API responses keyed by request URL.
+    Each entry keeps the ETag, the Link header and the raw body so a
+    304 Not Modified answer can be replayed without re-downloading.
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_fetched = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def get(self, key):
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable cache entry {path.name}: {e}")
+            return None
+
+    def put(self, key, etag, body, link=None):
+        if not etag:
+            return
+        entry = {'etag': etag, 'link': link, 'body': body}
+        path = self._path(key)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def record_hit(self, entry):
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(entry['body'].encode())
+
+    def record_miss(self, body):
+        with self._lock:
+            self.misses += 1
+            self.bytes_fetched += len(body.encode())
+
+    def report(self):
+        logging.info(
+            f"HTTP cache: {self.hits} hits, {self.misses} misses, "
+            f"{self.bytes_saved} bytes not re-downloaded, "
+            f"{self.hits} rate-limited requests saved"
+        )
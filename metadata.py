@@ -0,0 +1,98 @@
+import json
+import logging
+from pathlib import Path
+from github_client import GitHubClient
+
+METADATA_FILE_NAME = 'METADATA.json'
+GRAPHQL_BATCH_SIZE = 100
+
+REPO_FIELDS = """
+    defaultBranchRef { target { oid } }
+    pushedAt
+    diskUsage
+    isArchived
+"""
+
+logging.basicConfig(level=logging.INFO)
+
+def build_metadata_query(full_names):
+    """Build one GraphQL query with an aliased repository() field per repo."""
+    fields = []
+    for i, full_name in enumerate(full_names):
+        owner, name = full_name.split('/', 1)
+        fields.append(f'r{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) {{{REPO_FIELDS}}}')
+    return "query {\n" + "\n".join(fields) + "\n}"
+
+def parse_repo_node(node):
+    branch = node.get('defaultBranchRef') or {}
+    return {
+        'head_oid': (branch.get('target') or {}).get('oid'),
+        'pushed_at': node.get('pushedAt'),
+        'disk_usage': node.get('diskUsage'),
+        'is_archived': node.get('isArchived', False),
+    }
+
+def fetch_repo_metadata(full_names, batch_size=GRAPHQL_BATCH_SIZE):
+    """
+    Return {"owner/repo": metadata} for the given repositories, querying
+    the GraphQL API for `batch_size` repositories per request. Repositories
+    that cannot be resolved (deleted, renamed, private) are left out.
+    """
+    metadata = {}
+    with GitHubClient(pool_size=1) as gh:
+        for start in range(0, len(full_names), batch_size):
+            batch = full_names[start:start + batch_size]
+            try:
+                response = gh.post(
+                    '/graphql',
+                    json={'query': build_metadata_query(batch)},
+                    timeout=60
+                )
+                response.raise_for_status()
+                payload = response.json()
+            except Exception as e:
+                logging.error(f"GraphQL metadata query failed for {len(batch)} repos: {e}")
+                continue
+
+            data = payload.get('data') or {}
+            for i, full_name in enumerate(batch):
+                node = data.get(f'r{i}')
+                if node:
+                    metadata[full_name] = parse_repo_node(node)
+            for error in payload.get('errors', []):
+                logging.warning(f"GraphQL: {error.get('message')}")
+
+    logging.info(f"Fetched metadata for {len(metadata)}/{len(full_names)} repositories "
+                 f"in {-(-len(full_names) // batch_size)} queries")
+    return metadata
+
+def load_repo_metadata(repo_dir):
+    """Return the metadata stored next to a summary, or None."""
+    path = Path(repo_dir) / METADATA_FILE_NAME
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable {path}: {e}")
+        return None
+
+def save_repo_metadata(repo_dir, metadata):
+    repo_dir = Path(repo_dir)
+    repo_dir.mkdir(parents=True, exist_ok=True)
+    with open(repo_dir / METADATA_FILE_NAME, 'w') as f:
+        json.dump(metadata, indent=2, fp=f)
+
+def needs_refresh(stored, current):
+    """
+    Decide whether an existing summary is stale. Without current metadata,
+    for archived repos, or for repos without a default-branch HEAD (e.g.
+    emptied ones), the summary is kept; otherwise it is stale only
+    when the default-branch HEAD has moved since it was generated.
+    """
+    if not current or current.get('is_archived') or not current.get('head_oid'):
+        return False
+    if not stored or not stored.get('head_oid'):
+        return False
+    return stored['head_oid'] != current.get('head_oid')
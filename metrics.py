@@ -0,0 +1,70 @@
+import math
+import time
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_timings = defaultdict(list)
+_counters = defaultdict(int)
+
+def record(name, seconds):
+    """Record one latency sample (in seconds) under `name`."""
+    with _lock:
+        _timings[name].append(seconds)
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+@contextmanager
+def timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def snapshot():
+    """Return {"timings": {name: stats}, "counters": {name: value}}."""
+    with _lock:
+        timings = {name: list(values) for name, values in _timings.items()}
+        counters = dict(_counters)
+    return {
+        "timings": {
+            name: {
+                "count": len(values),
+                "total": sum(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": max(values),
+            }
+            for name, values in timings.items()
+        },
+        "counters": counters,
+    }
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+def report(prefix=""):
+    """Log every timing and counter whose name starts with `prefix`."""
+    stats = snapshot()
+    for name, t in sorted(stats["timings"].items()):
+        if name.startswith(prefix):
+            logging.info(f"{name}: n={t['count']} p50={t['p50'] * 1000:.0f}ms "
+                         f"p95={t['p95'] * 1000:.0f}ms max={t['max'] * 1000:.0f}ms")
+    for name, value in sorted(stats["counters"].items()):
+        if name.startswith(prefix):
+            logging.info(f"{name}: {value}")
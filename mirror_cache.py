@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from pathlib import Path
+
+MIRROR_CACHE_DIR = Path(os.getenv('MIRROR_CACHE_DIR', './.cache/mirrors'))
+MIRROR_CACHE_MAX_BYTES = int(os.getenv('MIRROR_CACHE_MAX_BYTES', str(5 * 1024 ** 3)))
+# Blobs above this size are left on the server; docs that large are skipped anyway
+MIRROR_BLOB_LIMIT = os.getenv('MIRROR_BLOB_LIMIT', '10m')
+GIT_TIMEOUT = int(os.getenv('CLONE_TIMEOUT', '300'))
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+class MirrorCache:
+    """
+    Persistent cache of shallow bare repositories, one per starred repo.
+
+    The first use of a repo does a shallow bare clone; later runs only
+    `git fetch --depth 1` the new HEAD. Docs are read from the object store
+    with `git ls-tree` and `git cat-file --batch`, so nothing is checked out.
+    index.json records each mirror's size and last use, and the least
+    recently used mirrors are evicted once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, root=MIRROR_CACHE_DIR, max_bytes=MIRROR_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_file = self.root / 'index.json'
+        self._lock = threading.Lock()
+        self._in_use = set()
+
+    def path_for(self, name):
+        return self.root / f"{name}.git"
+
+    def _git(self, *args, cwd=None, **kwargs):
+        cmd = ['git'] + (['-C', str(cwd)] if cwd else []) + list(args)
+        return subprocess.run(cmd, check=True, capture_output=True, timeout=GIT_TIMEOUT, **kwargs)
+
+    def update(self, repo_url, name):
+        """
+        Clone or refresh the mirror for `name` and mark it in use until
+        release(name). Returns its path, or None on failure.
+        """
+        path = self.path_for(name)
+        with self._lock:
+            self._in_use.add(name)
+        try:
+            if path.exists():
+                before = self._git('rev-parse', 'HEAD', cwd=path).stdout.strip()
+                self._git('fetch', '--depth', '1', '--no-tags', 'origin', 'HEAD', cwd=path)
+                self._git('update-ref', 'HEAD', 'FETCH_HEAD', cwd=path)
+                after = self._git('rev-parse', 'HEAD', cwd=path).stdout.strip()
+                if before != after:
+                    # Drop the objects of the previous shallow commit
+                    self._git('gc', '--prune=now', '--quiet', cwd=path)
+                logging.info(f"Mirror for {name} fetched ({'updated' if before != after else 'unchanged'})")
+            else:
+                self._git('clone', '--bare', '--depth', '1', f'--filter=blob:limit={MIRROR_BLOB_LIMIT}',
+                          repo_url, str(path))
+                logging.info(f"Mirror for {name} created")
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            stderr = getattr(e, 'stderr', b'') or b''
+            logging.error(f"Failed to update mirror for {repo_url}: {stderr.decode(errors='ignore').strip() or e}")
+            if not (path / 'HEAD').exists():
+                shutil.rmtree(path, ignore_errors=True)
+            self.release(name)
+            return None
+
+        self._touch(name, dir_size(path))
+        return path
+
+    def release(self, name):
+        with self._lock:
+            self._in_use.discard(name)
+
+    def missing_blobs(self, path):
+        """
+        Object ids the partial clone left on the server (blobs above
+        MIRROR_BLOB_LIMIT). `rev-list --missing=print` lists them without
+        the lazy fetch that cat-file would trigger for each one.
+        """
+        listing = self._git('rev-list', '--objects', '--missing=print', '--no-object-names', 'HEAD',
+                            cwd=path).stdout
+        return {line[1:] for line in listing.splitlines() if line.startswith(b'?')}
+
+    def read_blobs(self, path, path_filter, max_size=None):
+        """
+        Yield (rel_path, data) for every blob at HEAD whose path passes
+        path_filter, reading them in one `cat-file --batch` process.
+        Blobs larger than max_size, or not in the mirror at all, are skipped
+        without being fetched.
+        """
+        listing = self._git('ls-tree', '-r', '-z', 'HEAD', cwd=path).stdout
+        wanted = []
+        for record in listing.split(b'\0'):
+            if not record:
+                continue
+            meta, rel_path = record.split(b'\t', 1)
+            _, obj_type, oid = meta.split()
+            rel_path = rel_path.decode('utf-8', errors='surrogateescape')
+            if obj_type == b'blob' and path_filter(rel_path):
+                wanted.append((oid, rel_path))
+        if not wanted:
+            return
+
+        missing = self.missing_blobs(path)
+        if missing:
+            logging.info(f"Skipping {sum(1 for oid, _ in wanted if oid in missing)} docs above the mirror blob limit")
+            wanted = [(oid, rel_path) for oid, rel_path in wanted if oid not in missing]
+            if not wanted:
+                return
+
+        # Newer git honours GIT_NO_LAZY_FETCH, so nothing is fetched even if an object went missing since
+        env = dict(os.environ, GIT_NO_LAZY_FETCH='1')
+        checks = self._git('cat-file', '--batch-check=%(objectname) %(objectsize)', cwd=path, env=env,
+                           input=b''.join(oid + b'\n' for oid, _ in wanted)).stdout.splitlines()
+        wanted = [
+            (oid, rel_path) for (oid, rel_path), check in zip(wanted, checks)
+            if not check.endswith(b' missing') and (not max_size or int(check.split()[1]) <= max_size)
+        ]
+
+        proc = subprocess.Popen(['git', '-C', str(path), 'cat-file', '--batch'],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+        try:
+            writer = threading.Thread(
+                target=lambda: (proc.stdin.write(b''.join(oid + b'\n' for oid, _ in wanted)), proc.stdin.close()),
+                daemon=True
+            )
+            writer.start()
+            for _, rel_path in wanted:
+                header = proc.stdout.readline().split()
+                if len(header) < 3 or header[1] == b'missing':
+                    continue
+                data = proc.stdout.read(int(header[2]))
+                proc.stdout.read(1)  # trailing newline
+                yield rel_path, data
+            writer.join()
+        finally:
+            proc.stdout.close()
+            proc.wait()
+
+    def _load_index(self):
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                logging.warning("Mirror cache index unreadable, rebuilding")
+        return {}
+
+    def _save_index(self, index):
+        tmp_file = self.index_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(index, indent=2, fp=f)
+        os.replace(tmp_file, self.index_file)
+
+    def _touch(self, name, size):
+        with self._lock:
+            index = self._load_index()
+            index[name] = {'size': size, 'last_used': time.time()}
+            self._evict(index, keep=name)
+            self._save_index(index)
+
+    def _evict(self, index, keep=None):
+        """Remove least recently used mirrors until the cache fits in max_bytes."""
+        total = sum(entry['size'] for entry in index.values())
+        for name in sorted(index, key=lambda n: index[n]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if name == keep or name in self._in_use:
+                continue
+            shutil.rmtree(self.path_for(name), ignore_errors=True)
+            total -= index.pop(name)['size']
+            logging.info(f"Evicted mirror {name} from cache ({total} bytes in use)")
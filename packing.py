@@ -0,0 +1,261 @@
+import os
+import re
+import json
+import hashlib
+import logging
+from functools import lru_cache
+from pathlib import PurePosixPath
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+PACKING_FILE_NAME = 'PACKING.json'
+# Roughly what the old 200,000-character cap allowed
+DOCS_TOKEN_BUDGET = int(os.getenv('DOCS_TOKEN_BUDGET', '50000'))
+# No single file may take more than this, so one huge page can't crowd out the rest
+DOCS_FILE_TOKEN_LIMIT = int(os.getenv('DOCS_FILE_TOKEN_LIMIT', '20000'))
+# A truncated file is only worth including if at least this much of it fits
+MIN_FILE_TOKENS = 200
+# On average one file in this many closes a map-reduce chunk (see chunk_docs)
+CHUNK_ANCHOR_FILES = 4
+
+INDEX_STEMS = {'readme', 'index', 'overview', 'introduction', 'intro'}
+GUIDE_WORDS = ('guide', 'tutorial', 'getting-started', 'getting_started', 'quickstart', 'quick-start',
+               'quick_start', 'usage', 'install', 'howto', 'how-to', 'example', 'walkthrough')
+META_STEMS = {'contributing', 'code_of_conduct', 'code-of-conduct', 'security', 'license', 'support',
+              'governance', 'maintainers', 'authors', 'pull_request_template', 'issue_template'}
+CHANGELOG_STEMS = {'changelog', 'changes', 'history', 'news', 'releases', 'release-notes',
+                   'release_notes', 'upgrading', 'migration'}
+LANG_CODES = {'ar', 'bn', 'cs', 'da', 'de', 'el', 'es', 'fa', 'fi', 'fr', 'he', 'hi', 'hu', 'id', 'it',
+              'ja', 'jp', 'ko', 'kr', 'ms', 'nl', 'no', 'pl', 'pt', 'pt-br', 'pt_br', 'ro', 'ru', 'sv', 'th',
+              'tr', 'uk', 'vi', 'zh', 'cn', 'zh-cn', 'zh_cn', 'zh-hans', 'zh-hant', 'zh-tw', 'zh_tw', 'tw'}
+TRANSLATION_DIRS = {'i18n', 'l10n', 'translations', 'translation', 'locales', 'locale', 'lang'}
+LANG_SUFFIX_RE = re.compile(r'[._-]([a-z]{2}(?:[-_][a-z]{2,4})?)$')
+
+# Lower tiers are packed first
+TIER_ROOT_README = 0
+TIER_INDEX = 1
+TIER_GUIDE = 2
+TIER_OTHER = 3
+TIER_META = 4
+TIER_CHANGELOG = 5
+TIER_TRANSLATION = 6
+
+logging.basicConfig(level=logging.INFO)
+
+def is_translation(path):
+    parts = [part.lower() for part in path.parts[:-1]]
+    if any(part in TRANSLATION_DIRS or part in LANG_CODES for part in parts):
+        return True
+    match = LANG_SUFFIX_RE.search(path.stem.lower())
+    return bool(match and match.group(1) in LANG_CODES)
+
+def doc_tier(rel_path):
+    """Rank a repo-relative doc path: root README, index pages, guides, ..., translations."""
+    path = PurePosixPath(str(rel_path).replace('\\', '/'))
+    stem = path.stem.lower()
+    lowered = str(path).lower()
+
+    if is_translation(path):
+        return TIER_TRANSLATION
+    if stem in CHANGELOG_STEMS or any(part.lower() in CHANGELOG_STEMS for part in path.parts[:-1]):
+        return TIER_CHANGELOG
+    if len(path.parts) == 1 and stem == 'readme':
+        return TIER_ROOT_README
+    if stem in META_STEMS:
+        return TIER_META
+    if stem in INDEX_STEMS:
+        return TIER_INDEX
+    if any(word in lowered for word in GUIDE_WORDS):
+        return TIER_GUIDE
+    return TIER_OTHER
+
+def rank_docs(rel_paths):
+    """Sort repo-relative paths by tier, then depth, then path."""
+    return sorted(rel_paths, key=lambda p: (doc_tier(p), len(PurePosixPath(str(p)).parts), str(p).lower()))
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    """Return the tiktoken encoding for a model, or None if tiktoken is unavailable."""
+    if tiktoken is None:
+        logging.warning("tiktoken is not installed, estimating 4 characters per token")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding('o200k_base')
+    except Exception as e:
+        # The encoding files are downloaded on first use
+        logging.warning(f"Could not load a tiktoken encoding for {model} ({e}), estimating 4 characters per token")
+        return None
+
+def count_tokens(text, model):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_tokens(text, max_tokens, model):
+    """Cut text down to at most max_tokens tokens."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+def split_tokens(text, max_tokens, model):
+    """Split text into consecutive pieces of at most max_tokens tokens."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        step = max_tokens * 4
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+def split_paragraphs(text, max_tokens, model):
+    """
+    Split text into pieces of at most max_tokens tokens, breaking between
+    paragraphs where possible and inside a paragraph only when it alone is
+    too long.
+    """
+    pieces = []
+    current = []
+    current_tokens = 0
+    for paragraph in text.split('\n\n'):
+        tokens = count_tokens(paragraph, model) + 1
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append('\n\n'.join(current))
+            current, current_tokens = [], 0
+        if tokens > max_tokens:
+            pieces.extend(split_tokens(paragraph, max_tokens, model))
+            continue
+        current.append(paragraph)
+        current_tokens += tokens
+    if current:
+        pieces.append('\n\n'.join(current))
+    return pieces
+
+def is_chunk_anchor(rel_path):
+    """Whether a chunk closes after this file; decided by the path alone so edits never move it."""
+    digest = hashlib.sha256(str(rel_path).encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') % CHUNK_ANCHOR_FILES == 0
+
+def chunk_docs(docs, model, chunk_tokens):
+    """
+    Cut (rel_path, text) pairs into chunks of about `chunk_tokens` tokens,
+    in rank_docs() order. Small files share a chunk, which closes after an
+    anchor file (see is_chunk_anchor) or when the next file won't fit, so
+    editing one file only changes its own chunk and the ones up to the next
+    anchor. Large files are split between paragraphs into chunks of their
+    own, each part under its own banner.
+    Returns a list of {'text', 'files', 'tokens', 'digest'} dicts.
+    """
+    texts = dict(docs)
+    chunks = []
+    pieces, files = [], []
+    used = 0
+
+    def flush():
+        nonlocal pieces, files, used
+        if pieces:
+            text = ''.join(pieces)
+            chunks.append({
+                'text': text,
+                'files': list(files),
+                'tokens': used,
+                'digest': hashlib.sha256(text.encode('utf-8')).hexdigest(),
+            })
+        pieces, files, used = [], [], 0
+
+    def add(rel_path, name, piece, size):
+        nonlocal used
+        pieces.append(file_banner(name) + piece)
+        if str(rel_path) not in files:
+            files.append(str(rel_path))
+        used += size
+
+    for rel_path in rank_docs(texts):
+        banner_tokens = count_tokens(file_banner(rel_path), model)
+        text = texts[rel_path]
+        tokens = count_tokens(text, model)
+        if tokens + banner_tokens <= chunk_tokens:
+            if used and used + banner_tokens + tokens > chunk_tokens:
+                flush()
+            add(rel_path, rel_path, text, banner_tokens + tokens)
+            if is_chunk_anchor(rel_path):
+                flush()
+            continue
+
+        flush()
+        split = split_paragraphs(text, chunk_tokens - banner_tokens * 2, model)
+        for i, piece in enumerate(split, 1):
+            name = f"{rel_path} (part {i}/{len(split)})"
+            add(rel_path, name, piece, count_tokens(file_banner(name), model) + count_tokens(piece, model))
+            flush()
+    flush()
+    return chunks
+
+def file_banner(name):
+    return f"\n\n==> {name} <==\n"
+
+def pack_docs(docs, model, budget=DOCS_TOKEN_BUDGET, file_limit=DOCS_FILE_TOKEN_LIMIT):
+    """
+    Pack (rel_path, text) pairs into one prompt body of at most `budget`
+    tokens. Files are taken in rank_docs() order, each capped at
+    `file_limit` tokens and truncated to whatever budget is left; a file
+    that would get fewer than MIN_FILE_TOKENS is skipped instead, so
+    smaller files further down the ranking can still fit.
+    Returns (content, manifest).
+    """
+    texts = dict(docs)
+    included = []
+    skipped = []
+    pieces = []
+    used = 0
+
+    for rel_path in rank_docs(texts):
+        text = texts[rel_path]
+        banner = file_banner(rel_path)
+        banner_tokens = count_tokens(banner, model)
+        tokens = count_tokens(text, model)
+        allowed = min(file_limit, budget - used - banner_tokens)
+
+        if tokens > allowed and allowed < MIN_FILE_TOKENS:
+            skipped.append({'path': str(rel_path), 'tokens': tokens, 'tier': doc_tier(rel_path)})
+            continue
+
+        truncated = tokens > allowed
+        if truncated:
+            text = truncate_tokens(text, allowed, model)
+            kept = count_tokens(text, model)
+        else:
+            kept = tokens
+
+        pieces.append(banner + text)
+        used += banner_tokens + kept
+        included.append({
+            'path': str(rel_path),
+            'tier': doc_tier(rel_path),
+            'tokens': tokens,
+            'included_tokens': kept,
+            'truncated': truncated,
+        })
+
+    manifest = {
+        'model': model,
+        'budget': budget,
+        'used_tokens': used,
+        'tokenizer': 'tiktoken' if get_encoding(model) else 'estimate',
+        'included': included,
+        'skipped': skipped,
+    }
+    return ''.join(pieces), manifest
+
+def save_packing_manifest(repo_dir, manifest):
+    with open(os.path.join(repo_dir, PACKING_FILE_NAME), 'w') as f:
+        json.dump(manifest, indent=2, fp=f)
@@ -0,0 +1,84 @@
+import os
+import logging
+import threading
+from collections import defaultdict
+
+SUMMARY_POLICY = os.getenv('SUMMARY_POLICY', '1') != '0'
+# Docs up to this many packed tokens, in at most POLICY_SMALL_FILES files, get a condensed summary
+POLICY_SMALL_TOKENS = int(os.getenv('POLICY_SMALL_TOKENS', '2000'))
+POLICY_SMALL_FILES = int(os.getenv('POLICY_SMALL_FILES', '3'))
+# Docs up to this many packed tokens get the full prompt with a smaller output budget
+POLICY_MEDIUM_TOKENS = int(os.getenv('POLICY_MEDIUM_TOKENS', '12000'))
+
+PROMPT_CONDENSED = 'condensed'
+PROMPT_STANDARD = 'standard'
+PROMPT_EXHAUSTIVE = 'exhaustive'
+
+# tier: (model, max_tokens, prompt); a model of None means the default OPENAI_MODEL
+TIERS = {
+    'small': (os.getenv('POLICY_SMALL_MODEL'), int(os.getenv('POLICY_SMALL_MAX_TOKENS', '1024')), PROMPT_CONDENSED),
+    'medium': (os.getenv('POLICY_MEDIUM_MODEL'), int(os.getenv('POLICY_MEDIUM_MAX_TOKENS', '2048')), PROMPT_STANDARD),
+    'large': (os.getenv('POLICY_LARGE_MODEL'), int(os.getenv('POLICY_LARGE_MAX_TOKENS', '4096')), PROMPT_EXHAUSTIVE),
+}
+
+logging.basicConfig(level=logging.INFO)
+
+class SummaryPolicy:
+    """The model, output budget and prompt variant used for one repo's summary."""
+
+    def __init__(self, tier, model, max_tokens, prompt):
+        self.tier = tier
+        self.model = model
+        self.max_tokens = max_tokens
+        self.prompt = prompt
+
+    def signature(self):
+        """Everything besides the docs that changes the summary, for cache keys."""
+        return f"{self.tier}:{self.model}:{self.max_tokens}:{self.prompt}"
+
+    def __repr__(self):
+        return f"SummaryPolicy({self.signature()})"
+
+def choose_policy(doc_tokens, file_count, default_model, default_max_tokens):
+    """
+    Pick a tier from the packed docs size and file count: a README-sized
+    repo gets a condensed prompt and a small output budget, mid-sized docs
+    every section written briefly within a reduced budget, everything else
+    the defaults.
+    With SUMMARY_POLICY=0 every repo gets the default model, budget and prompt.
+    """
+    if not SUMMARY_POLICY:
+        return SummaryPolicy('default', default_model, default_max_tokens, PROMPT_EXHAUSTIVE)
+    if doc_tokens <= POLICY_SMALL_TOKENS and file_count <= POLICY_SMALL_FILES:
+        tier = 'small'
+    elif doc_tokens <= POLICY_MEDIUM_TOKENS:
+        tier = 'medium'
+    else:
+        tier = 'large'
+    model, max_tokens, prompt = TIERS[tier]
+    return SummaryPolicy(tier, model or default_model, min(max_tokens, default_max_tokens), prompt)
+
+class PolicyStats:
+    """Per-tier count of summaries requested and of tokens saved against the default policy."""
+
+    def __init__(self):
+        self.tiers = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def record(self, policy, doc_tokens, output_budget_saved, prompt_tokens_saved):
+        with self._lock:
+            stats = self.tiers[policy.tier]
+            stats['repos'] += 1
+            stats['doc_tokens'] += doc_tokens
+            stats['output_budget_saved'] += output_budget_saved
+            stats['prompt_tokens_saved'] += prompt_tokens_saved
+
+    def report(self):
+        with self._lock:
+            tiers = {tier: dict(stats) for tier, stats in self.tiers.items()}
+        for tier, stats in sorted(tiers.items()):
+            logging.info(
+                f"Policy tier {tier}: {stats['repos']} summaries, {stats['doc_tokens']} doc tokens, "
+                f"{stats['output_budget_saved']} tokens of output budget and {stats['prompt_tokens_saved']} "
+                f"prompt tokens saved against the default policy"
+            )
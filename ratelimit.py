@@ -0,0 +1,62 @@
+import time
+import asyncio
+
+class TokenBucket:
+    """Bucket holding up to `capacity` units that refills at `capacity` per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units are available (amount is capped at capacity)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+class RateLimiter:
+    """
+    Async limiter for requests/min and tokens/min. acquire(tokens) waits
+    until both buckets can cover one request of `tokens` tokens, then
+    deducts it. Also keeps totals for an achieved-throughput report.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = asyncio.Lock()
+        self.started = time.monotonic()
+        self.request_count = 0
+        self.tokens_used = 0
+
+    async def acquire(self, tokens):
+        async with self._lock:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+
+    def record(self, tokens):
+        """Record the tokens a finished request actually used."""
+        self.request_count += 1
+        self.tokens_used += tokens
+
+    def achieved(self):
+        """Return (requests/min, tokens/min) since the limiter was created."""
+        minutes = max(time.monotonic() - self.started, 1e-9) / 60
+        return self.request_count / minutes, self.tokens_used / minutes
@@ -0,0 +1,136 @@
+import os
+import re
+import gzip
+import difflib
+import logging
+from collections import Counter
+from pathlib import Path
+from packing import rank_docs, file_banner
+
+# Snapshots live next to each SUMMARY.md (<SNAPSHOT_DIR>/<repo>/SNAPSHOT.txt.gz) so they are
+# committed with it; a CI cache would be evicted between weekly runs
+SNAPSHOT_DIR = Path(os.getenv('SNAPSHOT_DIR', './github_docs'))
+SNAPSHOT_FILE_NAME = 'SNAPSHOT.txt.gz'
+# Where snapshots were kept before; still read so existing ones aren't lost
+LEGACY_SNAPSHOT_DIR = Path('./.cache/snapshots')
+NO_CHANGES = 'NO_CHANGES'
+
+HEADING_RE = re.compile(r'^(#{1,6})[ \t]+(.+?)[ \t#]*$')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+
+logging.basicConfig(level=logging.INFO)
+
+def render_snapshot(docs):
+    """Render (rel_path, text) pairs the way a summary reads them, in rank order."""
+    texts = dict(docs)
+    return ''.join(file_banner(rel_path) + texts[rel_path] for rel_path in rank_docs(texts))
+
+def _snapshot_path(repo_name):
+    return SNAPSHOT_DIR / repo_name / SNAPSHOT_FILE_NAME
+
+def load_snapshot(repo_name):
+    """Return the docs snapshot the current summary was built from, or None."""
+    path = _snapshot_path(repo_name)
+    if not path.exists():
+        path = LEGACY_SNAPSHOT_DIR / f"{repo_name}.txt.gz"
+        if not path.exists():
+            return None
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return f.read()
+    except (OSError, EOFError) as e:
+        logging.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+
+def save_snapshot(repo_name, snapshot):
+    path = _snapshot_path(repo_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    # mtime=0 keeps the file byte-identical when the docs haven't changed, so git sees no change
+    with open(tmp_path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+        f.write(snapshot.encode('utf-8'))
+    os.replace(tmp_path, path)
+
+def docs_diff(old, new, context=3):
+    """Unified diff between two snapshots, or '' when they are the same."""
+    if old == new:
+        return ''
+    return ''.join(difflib.unified_diff(
+        old.splitlines(keepends=True), new.splitlines(keepends=True),
+        fromfile='previous', tofile='current', n=context
+    ))
+
+def heading_key(text):
+    return re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip()
+
+def find_headings(markdown):
+    """
+    (offset, level, title) for every heading line, skipping fenced code
+    blocks so `# comment` lines in a bash block are not read as headings.
+    """
+    headings = []
+    in_fence = False
+    offset = 0
+    for line in markdown.splitlines(keepends=True):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        elif not in_fence:
+            match = HEADING_RE.match(line.rstrip('\r\n'))
+            if match:
+                headings.append((offset, len(match.group(1)), match.group(2)))
+        offset += len(line)
+    return headings
+
+def section_level(markdown):
+    """The heading level the document is divided into sections at: the shallowest one used more than once."""
+    counts = Counter(level for _, level, _ in find_headings(markdown))
+    if not counts:
+        return None
+    repeated = [level for level in sorted(counts) if counts[level] > 1]
+    return repeated[0] if repeated else min(counts)
+
+def split_sections(markdown, level):
+    """Split markdown at headings of `level` into (preamble, [(key, text), ...])."""
+    starts = [(offset, title) for offset, heading_level, title in find_headings(markdown) if heading_level == level]
+    if not starts:
+        return markdown, []
+    preamble = markdown[:starts[0][0]]
+    sections = []
+    for i, (offset, title) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(markdown)
+        sections.append((heading_key(title), markdown[offset:end]))
+    return preamble, sections
+
+def apply_section_patch(summary, patch):
+    """
+    Apply a model reply listing rewritten sections to a summary. Each
+    returned section replaces the section with the same heading, unknown
+    headings at the summary's section level are appended. Returns None if
+    the reply has no usable sections or uses a different heading level.
+    """
+    if patch.strip() == NO_CHANGES:
+        return summary
+    level = section_level(summary)
+    patch_headings = find_headings(patch)
+    if level is None or not patch_headings:
+        return None
+
+    # A reply whose sections sit at another depth can't be matched against the
+    # summary; appending them would duplicate sections, so fall back instead
+    first_offset, first_level, _ = patch_headings[0]
+    if first_level != level or any(heading_level < level for _, heading_level, _ in patch_headings):
+        return None
+
+    preamble, sections = split_sections(summary, level)
+    _, patched = split_sections(patch[first_offset:], level)
+    replacements = dict(patched)
+    if not replacements:
+        return None
+
+    merged = []
+    for key, text in sections:
+        replacement = replacements.pop(key, None)
+        merged.append(replacement if replacement is not None else text)
+    merged.extend(text for key, text in patched if key in replacements)
+    # Every section ends in one blank line, whatever the replacement ended with
+    return preamble + ''.join(text.rstrip() + '\n\n' for text in merged).rstrip() + '\n'
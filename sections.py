@@ -0,0 +1,84 @@
+import os
+import re
+import logging
+
+# Generate the summary's sections in SECTION_BATCHES concurrent requests instead of one
+SECTION_PARALLEL = os.getenv('SECTION_PARALLEL', '0') == '1'
+SECTION_BATCHES = int(os.getenv('SECTION_BATCHES', '4'))
+# Each batch may use this multiple of its proportional share of the output budget
+SECTION_BUDGET_SLACK = 1.5
+
+SECTION_RE = re.compile(r'^### (\d+)\. (.+)$', re.M)
+# Only "#", "##" or "###" headings numbered like "4. Title" start a section; "4.1 ..." does not
+REPLY_HEADING_RE = re.compile(r'^#{1,3}[ \t]+(\d+)\.[ \t]+.*$', re.M)
+
+logging.basicConfig(level=logging.INFO)
+
+def parse_sections(instructions):
+    """
+    Split prompt instructions at their "### N. Title" headings. Returns
+    (preamble, sections) where sections are (number, title, block) tuples
+    and each block is the heading plus its bullet points.
+    """
+    matches = list(SECTION_RE.finditer(instructions))
+    if not matches:
+        return instructions, []
+    sections = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(instructions)
+        sections.append((int(match.group(1)), match.group(2).strip(), instructions[match.start():end].strip()))
+    return instructions[:matches[0].start()], sections
+
+def group_sections(sections, batches=SECTION_BATCHES):
+    """Split sections into at most `batches` consecutive groups whose sizes differ by at most one."""
+    batches = max(1, min(batches, len(sections)))
+    size, extra = divmod(len(sections), batches)
+    groups = []
+    start = 0
+    for i in range(batches):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(sections[start:end])
+        start = end
+    return groups
+
+def section_budget(max_tokens, group, total_sections):
+    """Output budget for one group: its share of max_tokens plus some slack, never more than max_tokens."""
+    share = max_tokens * len(group) / total_sections
+    return min(max_tokens, int(share * SECTION_BUDGET_SLACK))
+
+def split_reply(reply, numbers):
+    """
+    Cut a reply into {number: body} for the expected section numbers. A
+    numbered heading only counts if it is one of `numbers` that hasn't been
+    seen yet, so numbered lists inside a section don't split it.
+    """
+    expected = set(numbers)
+    found = []
+    for match in REPLY_HEADING_RE.finditer(reply):
+        number = int(match.group(1))
+        if number in expected:
+            expected.discard(number)
+            found.append((number, match))
+    bodies = {}
+    for i, (number, match) in enumerate(found):
+        end = found[i + 1][1].start() if i + 1 < len(found) else len(reply)
+        bodies[number] = reply[match.end():end].strip()
+    return bodies
+
+def stitch_sections(groups, replies):
+    """
+    Join the replies for section groups into one summary, in canonical
+    section order and under the headings the prompt defines. Returns
+    (summary, missing) where missing lists section numbers no reply had.
+    """
+    parts = []
+    missing = []
+    for group, reply in zip(groups, replies):
+        bodies = split_reply(reply or '', [number for number, _, _ in group])
+        for number, title, _ in group:
+            body = bodies.get(number)
+            if body is None:
+                missing.append(number)
+                continue
+            parts.append(f"### {number}. {title}\n\n{body}\n")
+    return '\n'.join(parts), missing
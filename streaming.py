@@ -0,0 +1,84 @@
+import os
+import json
+import time
+from pathlib import Path
+
+PARTIAL_SUFFIX = '.partial'
+# Streamed text is flushed to disk at least this often, in seconds
+FSYNC_INTERVAL = float(os.getenv('STREAM_FSYNC_INTERVAL', '2'))
+
+class PartialSummary:
+    """
+    A summary being written as it streams in. Text is appended to
+    `<path>.partial` and fsync'ed every FSYNC_INTERVAL seconds; a
+    `<path>.partial.json` sidecar records the request key the text belongs
+    to, so an interrupted run can pick it up again. commit() atomically
+    renames the file over `path`.
+    """
+
+    def __init__(self, path, key, header=''):
+        self.path = Path(path)
+        self.partial_path = self.path.with_name(self.path.name + PARTIAL_SUFFIX)
+        self.meta_path = self.partial_path.with_name(self.partial_path.name + '.json')
+        self.key = key
+        self.header = header
+        self._file = None
+        self._synced_at = 0.0
+
+    def resume(self):
+        """Return the text a previous run streamed for the same key, or ''."""
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                if json.load(f).get('key') != self.key:
+                    return ''
+            with open(self.partial_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, ValueError):
+            return ''
+        return text[len(self.header):] if text.startswith(self.header) else ''
+
+    def open(self, text=''):
+        """Start the partial file over with the header and `text` already generated."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': self.key}, f)
+        self._file = open(self.partial_path, 'w', encoding='utf-8')
+        self._file.write(self.header + text)
+        self._sync()
+
+    def write(self, text):
+        self._file.write(text)
+        if time.monotonic() - self._synced_at >= FSYNC_INTERVAL:
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def commit(self):
+        """Move the finished text into place; readers never see a half-written file."""
+        self.close()
+        os.replace(self.partial_path, self.path)
+        self.discard()
+
+    def discard(self):
+        self.close()
+        for path in (self.partial_path, self.meta_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # Keep whatever was written so the next run can resume from it
+        self.close()
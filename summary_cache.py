@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+SUMMARY_CACHE_DIR = Path(os.getenv('SUMMARY_CACHE_DIR', './.cache/summaries'))
+
+def content_digest(*parts):
+    """SHA-256 over text parts, separated so ('ab', 'c') and ('a', 'bc') differ."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+class SummaryCache:
+    """
+    On-disk cache of generated summaries keyed by a digest of the doc
+    content that was sent, the prompt-template version and the model.
+    Identical docs (forks, mirrors, re-runs) map to the same entry, and
+    any change to the docs, prompt or model gives a new key.
+    """
+
+    def __init__(self, cache_dir=SUMMARY_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.misses = 0
+        self.tokens_avoided = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(docs_digest, prompt_version, model):
+        return content_digest(docs_digest, prompt_version, model)
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key):
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable summary cache entry {path.name}: {e}")
+            return None
+
+    def put(self, key, summary, tokens, repo_name=None):
+        """Store a summary along with the (estimated) tokens it cost to generate."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry = {'summary': summary, 'tokens': tokens, 'repo': repo_name}
+        path = self._path(key)
+        tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def record_hit(self, entry):
+        with self._lock:
+            self.hits += 1
+            self.tokens_avoided += entry.get('tokens') or 0
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def report(self):
+        logging.info(
+            f"Summary cache: {self.hits} hits, {self.misses} misses, "
+            f"~{self.tokens_avoided} tokens not sent to the model"
+        )
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+USAGE_LEDGER_FILE = Path(os.getenv('USAGE_LEDGER_FILE', './usage_ledger.jsonl'))
+# USD per million (input, cached input, output) tokens, by model name prefix
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4.1-nano': (0.10, 0.025, 0.40),
+    'gpt-4.1-mini': (0.40, 0.10, 1.60),
+    'gpt-4.1': (2.00, 0.50, 8.00),
+    'gpt-5-nano': (0.05, 0.005, 0.40),
+    'gpt-5-mini': (0.25, 0.025, 2.00),
+    'gpt-5': (1.25, 0.125, 10.00),
+    'o4-mini': (1.10, 0.275, 4.40),
+    'o3-mini': (1.10, 0.55, 4.40),
+}
+# Prices for models missing from MODEL_PRICES; the defaults are gpt-4o-mini list prices
+PRICE_INPUT = float(os.getenv('PRICE_INPUT_PER_M', '0.15'))
+PRICE_CACHED_INPUT = float(os.getenv('PRICE_CACHED_INPUT_PER_M', '0.075'))
+PRICE_OUTPUT = float(os.getenv('PRICE_OUTPUT_PER_M', '0.60'))
+# The Batch API bills half the regular price
+BATCH_DISCOUNT = 0.5
+
+logging.basicConfig(level=logging.INFO)
+
+def usage_tokens(usage):
+    """(prompt, cached, completion) tokens from an API usage object or its dict form."""
+    if usage is None:
+        return 0, 0, 0
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    details = usage.get('prompt_tokens_details') or {}
+    return usage.get('prompt_tokens') or 0, details.get('cached_tokens') or 0, usage.get('completion_tokens') or 0
+
+_unpriced_models = set()
+_unpriced_lock = threading.Lock()
+
+def model_prices(model):
+    """
+    (input, cached input, output) USD per million tokens for a model. Dated
+    snapshots match their base name (gpt-4o-mini-2024-07-18 is gpt-4o-mini);
+    unknown models get the PRICE_*_PER_M prices, with a warning once.
+    """
+    name = (model or '').lower()
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if name == prefix or name.startswith(prefix + '-'):
+            return MODEL_PRICES[prefix]
+    with _unpriced_lock:
+        if name not in _unpriced_models:
+            _unpriced_models.add(name)
+            logging.warning(f"No price known for model {model!r}, costing it at the PRICE_*_PER_M rates")
+    return PRICE_INPUT, PRICE_CACHED_INPUT, PRICE_OUTPUT
+
+def call_cost(prompt_tokens, cached_tokens, completion_tokens, batch=False, model=None):
+    price_input, price_cached, price_output = model_prices(model)
+    cost = ((prompt_tokens - cached_tokens) * price_input + cached_tokens * price_cached
+            + completion_tokens * price_output) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+class UsageLedger:
+    """
+    Append-only JSONL record of every model call: repo, kind (summary,
+    notes, patch), model, prompt/cached/completion tokens, latency and
+    estimated cost. Each process run gets its own run id; rollup() totals
+    the calls of one run.
+    """
+
+    def __init__(self, path=USAGE_LEDGER_FILE, run_id=None):
+        self.path = Path(path)
+        self.run_id = run_id or f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def record(self, repo, kind, model, usage, latency=None, batch=False):
+        prompt_tokens, cached_tokens, completion_tokens = usage_tokens(usage)
+        entry = {
+            'run': self.run_id,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'repo': repo,
+            'kind': kind,
+            'model': model,
+            'batch': batch,
+            'prompt_tokens': prompt_tokens,
+            'cached_tokens': cached_tokens,
+            'completion_tokens': completion_tokens,
+            'latency': round(latency, 3) if latency is not None else None,
+            'cost': round(call_cost(prompt_tokens, cached_tokens, completion_tokens, batch, model), 6),
+        }
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self.entries.append(entry)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError as e:
+                logging.error(f"Failed to write usage ledger {self.path}: {e}")
+
+    def rollup(self):
+        with self._lock:
+            return rollup(self.entries)
+
+    def report(self):
+        totals = self.rollup()
+        if not totals['calls']:
+            return
+        logging.info(
+            f"Usage for run {self.run_id}: {totals['calls']} calls, {totals['prompt_tokens']} prompt tokens "
+            f"({totals['cache_hit_rate']:.1%} cached), {totals['completion_tokens']} completion tokens, "
+            f"${totals['cost']:.4f} (${totals['cost_per_repo']:.4f} per repo over {totals['repos']} repos)"
+        )
+
+def rollup(entries):
+    """Totals over ledger entries: calls, tokens, cache hit rate, cost and cost per repo."""
+    prompt_tokens = sum(entry['prompt_tokens'] for entry in entries)
+    cached_tokens = sum(entry['cached_tokens'] for entry in entries)
+    cost = sum(entry['cost'] for entry in entries)
+    repos = len({entry['repo'] for entry in entries})
+    return {
+        'calls': len(entries),
+        'repos': repos,
+        'prompt_tokens': prompt_tokens,
+        'cached_tokens': cached_tokens,
+        'completion_tokens': sum(entry['completion_tokens'] for entry in entries),
+        'cache_hit_rate': cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+        'cost': cost,
+        'cost_per_repo': cost / repos if repos else 0.0,
+    }
+
+def load_ledger(path=USAGE_LEDGER_FILE):
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    return entries
+
+def main():
+    """Print a rollup per run recorded in the ledger: python usage.py [ledger.jsonl]"""
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else USAGE_LEDGER_FILE
+    runs = defaultdict(list)
+    for entry in load_ledger(path):
+        runs[entry['run']].append(entry)
+
+    print(f"{'run':24} {'calls':>6} {'repos':>6} {'prompt':>10} {'cached':>7} {'completion':>11} {'cost $':>9} {'$/repo':>8}")
+    for run_id, entries in runs.items():
+        t = rollup(entries)
+        print(f"{run_id:24} {t['calls']:>6} {t['repos']:>6} {t['prompt_tokens']:>10} {t['cache_hit_rate']:>6.1%} "
+              f"{t['completion_tokens']:>11} {t['cost']:>9.4f} {t['cost_per_repo']:>8.4f}")
+
+if __name__ == "__main__":
+    main()